@@ -0,0 +1,297 @@
+"""Rough benchmarks for the bits of the bot that don't need discord or a database to run.
+
+Usage: `python bench.py sweep`, `python bench.py th_lookup`, `python bench.py stats_for_th` (run `python bench.py -h` for the full list)
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from cogs.utils import sweep, war_index, th_stats
+
+
+class FakeAchievement:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeClan:
+    def __init__(self, tag, name, members=None):
+        self.tag = tag
+        self.name = name
+        self.members = members or []
+
+
+class FakePlayer:
+    def __init__(self, tag, donations, clan):
+        self.tag = tag
+        self.donations = donations
+        self.clan = clan
+        self.achievements_dict = {'Friend in Need': FakeAchievement(donations)}
+
+
+class FakeCOC:
+    """Stands in for the coc client, sleeping for `latency` seconds per request and counting calls.
+    """
+    def __init__(self, players, clans, latency):
+        self.players = players
+        self.clans = clans
+        self.latency = latency
+        self.calls = 0
+
+    async def get_player(self, tag):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.players[tag]
+
+    async def get_clan(self, tag):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.clans[tag]
+
+
+class FakeWarMember:
+    def __init__(self, tag, name, town_hall, map_position, is_opponent):
+        self.tag = tag
+        self.name = name
+        self.town_hall = town_hall
+        self.map_position = map_position
+        self.is_opponent = is_opponent
+        self.attacks = []
+
+
+class FakeWarAttack:
+    def __init__(self, order, attacker_tag, defender_tag, stars, destruction):
+        self.order = order
+        self.attacker_tag = attacker_tag
+        self.defender_tag = defender_tag
+        self.stars = stars
+        self.destruction = destruction
+
+
+class FakeWar:
+    def __init__(self, clan, opponent, members):
+        self.clan = clan
+        self.opponent = opponent
+        self.members = members
+        self.end_time = None
+
+
+def war_fixture(size):
+    """A finished `size`v`size` war where everyone used both attacks on a random base of the other clan.
+    """
+    ours = [FakeWarMember(f'#US{n}', f'us {n}', random.randint(9, 12), n + 1, False) for n in range(size)]
+    theirs = [FakeWarMember(f'#THEM{n}', f'them {n}', random.randint(9, 12), n + 1, True) for n in range(size)]
+
+    order = 0
+    for attackers, defenders in ((ours, theirs), (theirs, ours)):
+        for member in attackers:
+            for _ in range(2):
+                order += 1
+                defender = random.choice(defenders)
+                member.attacks.append(FakeWarAttack(order, member.tag, defender.tag,
+                                                    random.randint(0, 3), random.uniform(0, 100)))
+
+    return FakeWar(FakeClan('#AW', 'Aussie Warriors'), FakeClan('#ENEMY', 'Enemy'), ours + theirs)
+
+
+def legacy_war_lookups(war):
+    """How the town hall and defense lookups were done before, scanning the roster for every tag.
+    """
+    def town_hall(tag):
+        return [n.town_hall for n in war.members if n.tag == tag][0]
+
+    enemy_ths = [town_hall(attack.defender_tag) for member in war.members for attack in member.attacks]
+
+    defenses = []
+    for member in war.members:
+        if member.is_opponent:
+            continue
+        attacks_on_base = [a for n in war.members for a in n.attacks if a.defender_tag == member.tag]
+        same_th = [a for a in attacks_on_base if town_hall(a.attacker_tag) == town_hall(member.tag)]
+        defenses.append((sum(1 for a in same_th if a.stars != 3), len(same_th)))
+
+    return enemy_ths, defenses
+
+
+def indexed_war_lookups(war):
+    index = war_index.WarIndex(war)
+    enemy_ths = [index.town_hall(attack.defender_tag) for _, attack in index.attacks]
+    defenses = [index.defenses(n.tag) for n in index.ours]
+    return enemy_ths, defenses
+
+
+def war_stats_fixture(wars, players):
+    """`war_stats` rows for `players` members over `wars` wars, in both the old string and numeric forms.
+    """
+    ths = {f'#P{n}': random.choice([9, 10, 11, 12]) for n in range(players)}
+    rows = []
+    for war_no in range(1, wars + 1):
+        for tag, th in ths.items():
+            attacks, defenses = random.randint(0, 2), random.randint(0, 3)
+            hits, defended = random.randint(0, attacks), random.randint(0, defenses)
+            rows.append({'war_no': war_no, 'name': f'player {tag}', 'tag': tag, 'th': th,
+                         'hitrate': f'{hits}/{attacks}', 'defenserate': f'{defended}/{defenses}',
+                         'hits': hits, 'attacks': attacks, 'defended': defended, 'defenses': defenses})
+
+    legacy = [{k: v for k, v in row.items() if k not in ('hits', 'attacks', 'defended', 'defenses')} for row in rows]
+    numeric = [{k: v for k, v in row.items() if k not in ('hitrate', 'defenserate')} for row in rows]
+    return legacy, numeric
+
+
+def legacy_stats_for_th(rows, ths):
+    """How statsForTh used to add things up: for each TH, scan every row for every distinct player.
+    """
+    result = {}
+    for th in ths:
+        data = [n for n in rows if n['th'] == th]  # the first query
+        distinct = {(n['name'], n['tag']) for n in data}  # the second, DISTINCT name, tag query
+
+        result[th] = {}
+        for name, tag in distinct:
+            hits = attacks = defended = defenses = 0
+            for x in data:
+                if x['tag'] == tag:
+                    temp_hitrate = x['hitrate'].split('/')
+                    hits += int(temp_hitrate[0])
+                    attacks += int(temp_hitrate[1])
+                    temp_defenserate = x['defenserate'].split('/')
+                    defended += int(temp_defenserate[0])
+                    defenses += int(temp_defenserate[1])
+            result[th][tag] = (hits, attacks, defended, defenses)
+
+    return result
+
+
+def aggregated_stats_for_th(rows, ths):
+    by_th = th_stats.aggregate(rows)
+    return {th: {p.tag: (p.hits, p.attacks, p.defended, p.defenses) for p in by_th.get(th, [])} for th in ths}
+
+
+def sweep_fixture(accounts, active):
+    """`accounts` claimed accounts, the first 100 split between the two (50 member) home clans,
+    with a fraction `active` of them having donated since the last sweep.
+    """
+    aw = FakeClan('#AW', 'Aussie Warriors')
+    a4w = FakeClan('#A4W', 'Aussies 4 War')
+    elsewhere = FakeClan('#ELSEWHERE', 'Some Other Clan')
+
+    players = {}
+    last_seen = {}
+    for n in range(accounts):
+        clan = aw if n < 50 else a4w if n < 100 else elsewhere
+        player = FakePlayer(f'#{n}', random.randint(0, 5000), clan)
+        players[player.tag] = player
+        clan.members.append(player)
+        last_seen[player.tag] = player.donations if random.random() > active else player.donations - 1
+
+    return players, {'#AW': aw, '#A4W': a4w}, last_seen
+
+
+async def legacy_sweep(client, rows):
+    for row in rows:
+        await client.get_player(row['tag'])
+
+
+async def concurrent_sweep(client, rows, limit):
+    async for _ in sweep.fetch_many([n['tag'] for n in rows], client.get_player, limit=limit):
+        pass
+
+
+async def clan_sweep(client, rows, last_seen, limit):
+    members = {}
+    for clan_tag in ('#AW', '#A4W'):
+        clan = await client.get_clan(clan_tag)
+        members.update({n.tag: (clan.name, n.donations) for n in clan.members})
+
+    to_fetch, _ = sweep.split_by_clan(rows, members, last_seen)
+    await concurrent_sweep(client, to_fetch, limit)
+
+
+def bench_sweep(args):
+    loop = asyncio.get_event_loop()
+    print(f'{"accounts":>8} | {"mode":<16} | {"api calls":>9} | {"wall time":>9}')
+
+    for accounts in args.accounts:
+        players, clans, last_seen = sweep_fixture(accounts, args.active)
+        rows = [{'tag': tag} for tag in players]
+
+        runs = [
+            ('per-player', lambda c: legacy_sweep(c, rows)),
+            ('concurrent', lambda c: concurrent_sweep(c, rows, args.limit)),
+            ('clan-shortcut', lambda c: clan_sweep(c, rows, last_seen, args.limit)),
+        ]
+        for name, run in runs:
+            client = FakeCOC(players, clans, args.latency)
+            start = time.perf_counter()
+            loop.run_until_complete(run(client))
+            elapsed = time.perf_counter() - start
+            print(f'{accounts:>8} | {name:<16} | {client.calls:>9} | {elapsed:>8.2f}s')
+
+
+def bench_th_lookup(args):
+    war = war_fixture(args.size)
+    assert legacy_war_lookups(war) == indexed_war_lookups(war)
+
+    print(f'{args.size}v{args.size} war, {args.size * 4} attacks, best of {args.repeat}')
+    for name, run in (('roster scan', legacy_war_lookups), ('war index', indexed_war_lookups)):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run(war)
+            timings.append(time.perf_counter() - start)
+        print(f'{name:<12} | {min(timings) * 1000:>8.3f}ms')
+
+
+def bench_stats_for_th(args):
+    legacy, numeric = war_stats_fixture(args.wars, args.players)
+    ths = [9, 10, 11, 12]
+    expected = legacy_stats_for_th(legacy, ths)
+    assert aggregated_stats_for_th(legacy, ths) == expected
+    assert aggregated_stats_for_th(numeric, ths) == expected
+
+    print(f'{args.wars} wars x {args.players} players ({len(legacy)} rows), 4 THs, best of {args.repeat}')
+    runs = (
+        ('per-player scan', lambda: legacy_stats_for_th(legacy, ths)),
+        ('one pass (str)', lambda: aggregated_stats_for_th(legacy, ths)),
+        ('one pass (int)', lambda: aggregated_stats_for_th(numeric, ths)),
+    )
+    for name, run in runs:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        print(f'{name:<16} | {min(timings) * 1000:>8.3f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='bench')
+    sub.required = True
+
+    p = sub.add_parser('sweep', help='donation sweep: per-player vs concurrent vs clan member lists')
+    p.add_argument('--accounts', type=int, nargs='+', default=[100, 200, 400])
+    p.add_argument('--active', type=float, default=0.3, help='fraction of home clan members who donated')
+    p.add_argument('--latency', type=float, default=0.05, help='simulated seconds per API request')
+    p.add_argument('--limit', type=int, default=10, help='max. requests in flight')
+    p.set_defaults(func=bench_sweep)
+
+    p = sub.add_parser('th_lookup', help='war processing: roster scans vs a per-war index')
+    p.add_argument('--size', type=int, default=50, help='members per side')
+    p.add_argument('--repeat', type=int, default=20)
+    p.set_defaults(func=bench_th_lookup)
+
+    p = sub.add_parser('stats_for_th', help='warstats aggregation: per-player scans vs one pass')
+    p.add_argument('--wars', type=int, default=20)
+    p.add_argument('--players', type=int, default=50)
+    p.add_argument('--repeat', type=int, default=20)
+    p.set_defaults(func=bench_stats_for_th)
+
+    args = parser.parse_args()
+    random.seed(0)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
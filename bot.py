@@ -13,7 +13,7 @@ import coc
 import traceback
 
 from cogs.utils.db import Table
-from cogs.utils import context
+from cogs.utils import context, season, donation_cache, roster, claims_index
 import git
 import logging
 
@@ -43,11 +43,17 @@ with open(json_location) as creds:
 
 
 class AWBot(commands.Bot):
+    COC_UPDATE_INTERVAL = 100  # seconds between the events client's checks of the home clans and their wars
+
     def __init__(self):
         super().__init__(command_prefix=commands.when_mentioned_or('?'), case_insensitive=True)  # setup bot
         self.remove_command('help')
         self.loaded = creds
         self.coc = coc.login(email=creds['cocemail'], password=creds['cocpassword'], key_names='test', client=coc.EventsClient)
+        self.season = season.SeasonCache(self)  # active donation season, shared between cogs
+        self.donation_cache = donation_cache.DonationCache(self)  # claims/averages for the donation commands
+        self.roster = roster.Roster(self)  # member lists of the home clans
+        self.claims = claims_index.ClaimsIndex(self)  # claimed accounts by tag, IGN and discord user
 
         for e in initial_extensions:
             try:
@@ -94,6 +100,7 @@ class AWBot(commands.Bot):
         self.A4W_CLAN_TAG = '#808URP9P'
         self.loaded_extensions = initial_extensions  # for our reload_all command
         self.uptime = datetime.datetime.utcnow()
+        self.coc_updates_started = False
 
     async def on_message(self, message):
         if message.author.bot:
@@ -142,6 +149,23 @@ class AWBot(commands.Bot):
         """Useful for knowing when bot has connected
         """
         print(f'Ready: {self.user} (ID: {self.user.id})')
+        await self.start_coc_updates()
+
+    async def start_coc_updates(self):
+        """Subscribes the home clans to clan and war events and starts those updaters, once.
+
+        Clan updates drive the donation tracker and roster, war updates the attack capture in WarStats.
+        Cogs only register their handlers, so reloading one doesn't subscribe a clan twice.
+        """
+        if self.coc_updates_started:
+            return  # on_ready fires again on every reconnect
+        self.coc_updates_started = True
+
+        # with coc.py 0.2, add_clan_update is a coroutine (it can fetch the clans' members); the others aren't
+        await self.coc.add_clan_update([self.AW_CLAN_TAG, self.A4W_CLAN_TAG], retry_interval=self.COC_UPDATE_INTERVAL)
+        self.coc.add_war_update([self.AW_CLAN_TAG, self.A4W_CLAN_TAG], retry_interval=self.COC_UPDATE_INTERVAL)
+        self.coc.start_updates('clan')
+        self.coc.start_updates('war')
 
     async def on_command_error(self, ctx, error):
         if not isinstance(error, commands.CommandInvokeError):
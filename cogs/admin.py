@@ -218,6 +218,7 @@ class Admin(commands.Cog):
 
                     await ctx.db.execute(query, user_id, ign, tag, starting_donations, current_donations,
                                          difference, clan, exempt)
+                    self.bot.claims.add(tag, ign, user_id)
 
     @commands.command()
     @checks.is_owner()
@@ -1,9 +1,11 @@
+import asyncio
+
 from discord.ext import commands
 
-from cogs.utils import checks, db, paginator
+from cogs.utils import checks, db, paginator, sweep
 
 import discord
-from coc import InvalidArgument, NotFound
+from coc import HTTPException, InvalidArgument, NotFound
 
 import asyncpg.exceptions as pgexceptions
 
@@ -20,10 +22,42 @@ class Claims(db.Table):
     clan = db.Column(db.String())
     exempt = db.Column(db.Boolean())
 
+    @classmethod
+    def create_table(cls, *, exists_ok=True):
+        statement = super().create_table(exists_ok=exists_ok)
+        # for the keyset paginated awdon/a4wdon leaderboards
+        sql = "CREATE INDEX IF NOT EXISTS claims_clan_difference_tag_idx " \
+              "ON claims (clan, COALESCE(difference, 0), tag);"
+        return statement + '\n' + sql
+
 
 class Claim(commands.Cog):
+    IGN_CONCURRENCY = 10  # player fetches in flight for `updign all`, unless `sweepConcurrency` is set
+
     def __init__(self, bot):
         self.bot = bot
+        self.load_task = bot.loop.create_task(self.bot.claims.load())  # have the claims index ready for lookups
+
+    def cog_unload(self):
+        self.load_task.cancel()
+
+    async def find_claims(self, tag_or_ign):
+        """Returns the claimed accounts with a tag or IGN, suggesting similar IGNs if there aren't any.
+        """
+        await self.bot.claims.ensure_loaded()
+
+        accounts = self.bot.claims.resolve(tag_or_ign)
+        if accounts:
+            return accounts
+
+        if tag_or_ign.startswith('#'):
+            raise commands.BadArgument(f'Player tag {tag_or_ign} has not been claimed!')
+
+        fmt = f'IGN {tag_or_ign} has not been claimed!'
+        suggestions = self.bot.claims.close_matches(tag_or_ign)
+        if suggestions:
+            fmt += ' Did you mean ' + ', '.join(f'`{n}`' for n in suggestions) + '?'
+        raise commands.BadArgument(fmt)
 
     async def cog_command_error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
@@ -49,41 +83,27 @@ class Claim(commands.Cog):
             mention = ctx.author
 
         if player_tag.startswith('#'):
-            query = """SELECT * FROM claims WHERE tag = $1 AND userid = $2"""
-        else:
-            query = """SELECT * FROM claims WHERE ign = $1 AND userid = $2"""
-
-        dump = await ctx.db.fetchrow(query, player_tag, mention.id)
-
-        if dump:
-            ign = dump['ign']
-            tag = dump['tag']
-            member = ctx.guild.get_member(dump['userid'])
-            raise commands.BadArgument(f'{ign} ({tag}) has been claimed by '
-                                       f'{member.display_name}#{member.discriminator} ({member.id})')
-
-        if player_tag.startswith('#'):
-            try:
-                cocplayer = await self.bot.coc.get_player(player_tag)
-            except NotFound:
-                raise commands.BadArgument(f'Player tag `{player_tag}` not found!')
-
+            tag = player_tag.upper()
         else:
             # search aw players for x ign, then search a4w
-            aw_members = await self.bot.coc.get_clan('#P0LYJC8C').members
-            found = [n for n in aw_members if n.tag == player_tag]
-            if found:
-                cocplayer = await self.bot.coc.get_player(player_tag)
+            found = await self.bot.roster.find(player_tag)
+            if not found:
+                raise commands.BadArgument(f"I have checked in AW and A4W "
+                                           f"for an IGN matching `{player_tag}` - and couldn't find one!")
+            tag = found.tag
+
+        await self.bot.claims.ensure_loaded()
+        claimed = self.bot.claims.get(tag)
+        if claimed:
+            member = ctx.guild.get_member(claimed.userid)
+            owner = f'{member.display_name}#{member.discriminator}' if member else 'someone no longer in the server'
+            raise commands.BadArgument(f'{claimed.ign} ({claimed.tag}) has been claimed by '
+                                       f'{owner} ({claimed.userid})')
 
-            else:
-                a4w_members = await self.bot.coc.get_clan('#808URP9P').members
-                found = [n for n in a4w_members if n.tag == player_tag]
-                if found:
-                    cocplayer = await self.bot.coc.get_player(player_tag)
-
-                else:
-                    raise commands.BadArgument(f"I have checked in AW and A4W "
-                                               f"for an IGN matching `{player_tag}` - and couldn't find one!")
+        try:
+            cocplayer = await self.bot.coc.get_player(tag)
+        except NotFound:
+            raise commands.BadArgument(f'Player tag `{player_tag}` not found!')
 
         user_id = mention.id
         ign = cocplayer.name
@@ -119,6 +139,9 @@ class Claim(commands.Cog):
         except pgexceptions.UniqueViolationError:
             raise commands.BadArgument('Seems tag is already in `tag_to_id` DB, but not claims DB. Sorry')
 
+        self.bot.claims.add(tag, ign, user_id)
+        self.bot.donation_cache.invalidate(user_id)
+
         await ctx.send(f'{mention.display_name}, you have claimed {ign} ({tag})')
 
     @commands.command(aliases=['del'])
@@ -126,41 +149,40 @@ class Claim(commands.Cog):
         """Delete an account from the database
         Parameters: [player tag or ign]
         """
-        if tag_or_ign.startswith('#'):
-            query = 'SELECT * FROM claims WHERE tag = $1'
-            dump = await ctx.db.fetch(query, tag_or_ign)
-            if not dump:
-                raise commands.BadArgument(f'Player tag {tag_or_ign} has not been claimed!')
-            query = 'DELETE FROM claims WHERE tag = $1'
-            await ctx.db.execute(query, tag_or_ign)
-
-            query = 'DELETE FROM tag_to_id WHERE tag = $1'
-            await ctx.db.execute(query, tag_or_ign)
+        accounts = await self.find_claims(tag_or_ign)
+        tags = [n.tag for n in accounts]
 
-        else:
-            query = 'SELECT * FROM claims WHERE ign = $1'
-            dump = await ctx.db.fetchrow(query, tag_or_ign)
-            if not dump:
-                raise commands.BadArgument(f"IGN {tag_or_ign} has not been claimed!")
+        async with ctx.db.transaction():
+            query = 'DELETE FROM claims WHERE tag = ANY($1::text[])'
+            await ctx.db.execute(query, tags)
 
-            query = 'DELETE FROM claims WHERE ign = $1'
-            await ctx.db.execute(query, tag_or_ign)
+            query = 'DELETE FROM tag_to_id WHERE tag = ANY($1::text[])'
+            await ctx.db.execute(query, tags)
 
-            query = 'DELETE FROM tag_to_id WHERE tag = $1'
-            await ctx.db.execute(query, dump[2][0])
+        for account in accounts:
+            self.bot.claims.remove(account.tag)
+            self.bot.donation_cache.invalidate(account.userid)
 
         await ctx.message.add_reaction('\u2705')
 
     @commands.group()
     async def updign(self, ctx, tag: str):
-        """Update IGN of the tag supplied in DB
+        """Update IGN of the tag (or claimed IGN) supplied in DB
 
-        Parameters: [player tag]
+        Parameters: [player tag or IGN]
         """
-        fctn = await self.update_ign(tag)  # if tag not found in cocapi it will return false
+        if tag.startswith('#'):
+            await self.bot.claims.ensure_loaded()
+            claimed = self.bot.claims.get(tag)
+            tags = [claimed.tag if claimed else tag.upper()]  # the tag as it is stored
+        else:
+            tags = [n.tag for n in await self.find_claims(tag)]
+
+        for n in tags:
+            fctn = await self.update_ign(n)  # if tag not found in cocapi it will return false
 
-        if not fctn:
-            raise commands.BadArgument('Tag not found in clash of clans API')
+            if not fctn:
+                raise commands.BadArgument('Tag not found in clash of clans API')
 
         await ctx.message.add_reaction('\u2705')  # green tick --> success
 
@@ -174,15 +196,9 @@ class Claim(commands.Cog):
 
         Please use `updign` if possible; it is faster and easier.
         """
+        changed, stats = await self.update_igns()
 
-        query = 'SELECT tag FROM claims'
-        dump = await ctx.db.fetch(query)
-
-        tags = [x[0] for x in dump]  # get a list of tags from dump
-
-        for tag in tags:
-            await self.update_ign(tag)  # update ign for all tags in db
-
+        await ctx.send(f'{len(changed)} IGNs changed. Checked {stats}')
         await ctx.message.add_reaction('\u2705')  # green tick --> success
 
     @commands.command()
@@ -195,24 +211,10 @@ class Claim(commands.Cog):
 
         Please not that if it is a multi-word IGN you must surround it in quotation marks (eg. "maths man")
         """
-        if tag_or_ign.startswith('#'):
-
-            query = 'SELECT * FROM claims WHERE tag = $1'
-            dump = await ctx.db.fetch(query, tag_or_ign)
-            if not dump:
-                raise commands.BadArgument(f'No claimed account with tag {tag_or_ign}')
-
-            query = "UPDATE claims SET exempt=$1 WHERE tag=$2"
-            await ctx.db.execute(query, true_false, tag_or_ign)
+        accounts = await self.find_claims(tag_or_ign)
 
-        else:
-            query = 'SELECT * FROM claims WHERE ign = $1'
-            dump = await ctx.db.fetch(query, tag_or_ign)
-            if not dump:
-                raise commands.BadArgument(f'No claimed account with ign {tag_or_ign}')
-
-            query = "UPDATE claims SET exempt=$1 WHERE tag=$2"
-            await ctx.db.execute(query, true_false, tag_or_ign)
+        query = "UPDATE claims SET exempt=$1 WHERE tag = ANY($2::text[])"
+        await ctx.db.execute(query, true_false, [n.tag for n in accounts])
 
         await ctx.message.add_reaction('\u2705')
 
@@ -241,11 +243,10 @@ class Claim(commands.Cog):
         if not mention:
             mention = ctx.author
 
-        query = "SELECT ign, tag FROM claims WHERE userid=$1"
-        dump = await ctx.db.fetch(query, mention.id)
+        await self.bot.claims.ensure_loaded()
+        dump = self.bot.claims.by_user(mention.id)
 
-        players = '\n\n'.join(f'{ign} ({tag})'
-                              for (index, (ign, tag)) in enumerate(dump)) or 'No Members'
+        players = '\n\n'.join(f'{n.ign} ({n.tag})' for n in dump) or 'No Members'
 
         embed = discord.Embed(colour=discord.Colour.blue())
         embed.set_author(name='Claimed Accounts:')
@@ -257,7 +258,7 @@ class Claim(commands.Cog):
     async def aw_get_members(self, ctx):
         """Returns a pagination of all accounts, claimed and not, for AW
         """
-        clan_members = await self.bot.coc.get_clan('#P0LYJC8C', cache=True).members
+        clan_members = await self.bot.roster.members(self.bot.AW_CLAN_TAG)
 
         query = "SELECT ign, tag, userid FROM claims WHERE clan = $1"
         dump = await ctx.db.fetch(query, 'Aussie Warriors')
@@ -294,7 +295,7 @@ class Claim(commands.Cog):
     async def a4w_get_members(self, ctx):
         """Returns a pagination of all accounts, claimed and not, for A4W
         """
-        clan_members = await self.bot.coc.get_clan('#808URP9P', cache=True).members
+        clan_members = await self.bot.roster.members(self.bot.A4W_CLAN_TAG)
 
         query = "SELECT ign, tag, userid FROM claims WHERE clan = $1"
         dump = await ctx.db.fetch(query, 'Aussies 4 War')
@@ -329,25 +330,86 @@ class Claim(commands.Cog):
         await pages.paginate(start_page=1)
 
     async def donations_by_today(self):
-        query = "SELECT donationsbytoday FROM season WHERE toggle = $1"
-        dump = await self.bot.pool.fetchrow(query, True)
-
-        return dump[0]
+        return await self.bot.season.donations_by_today()
 
     async def update_ign(self, tag):
         try:
-            ign = await self.bot.coc.get_player(tag).name
-        except (InvalidArgument, AttributeError):
+            player = await self.bot.coc.get_player(tag)
+        except (InvalidArgument, NotFound):
             return False
 
-        query = 'UPDATE claims SET ign = $1 WHERE tag = $2'
-        await self.bot.pool.execute(query, ign, tag)
+        ign = player.name
+
+        query = 'UPDATE claims SET ign = $1 WHERE tag = $2 RETURNING userid'
+        dump = await self.bot.pool.fetchrow(query, ign, tag)
+        if dump:
+            self.bot.claims.rename(tag, ign)
+            self.bot.donation_cache.invalidate(dump['userid'])
 
         query = 'UPDATE war_stats SET name = $1 WHERE tag = $2'
         await self.bot.pool.execute(query, ign, tag)
 
+        stats = self.bot.get_cog('WarStats')
+        if stats:
+            stats.invalidate_warstats_pages()  # the cached pages have their old name
+
         return True
 
+    async def update_igns(self):
+        """Fetches every claimed account concurrently and stores the IGNs that have changed,
+        in `claims` and `war_stats`, in one transaction.
+
+        Returns a tuple of ([(tag, new ign)], SweepStats).
+        """
+        await self.bot.claims.ensure_loaded()
+
+        claimed = {n.tag: n for n in self.bot.claims.accounts()}
+        limit = int(self.bot.loaded.get('sweepConcurrency', self.IGN_CONCURRENCY))
+        stats = sweep.SweepStats()
+        changed = []
+
+        async for tag, player in sweep.fetch_many(claimed.keys(), self.bot.coc.get_player, limit=limit,
+                                                  errors=(HTTPException, InvalidArgument, asyncio.TimeoutError),
+                                                  stats=stats):
+            if player is None:
+                continue
+
+            if player.name == claimed[tag].ign:
+                stats.skipped += 1  # nothing to write
+            else:
+                changed.append((tag, player.name))
+
+        stats.finish()
+        if not changed:
+            return changed, stats
+
+        tags = [n[0] for n in changed]
+        igns = [n[1] for n in changed]
+
+        async with self.bot.pool.acquire() as con:
+            async with con.transaction():
+                query = """UPDATE claims SET ign = x.ign
+                           FROM unnest($1::text[], $2::text[]) AS x(tag, ign)
+                           WHERE claims.tag = x.tag
+                        """
+                await con.execute(query, tags, igns)
+
+                query = """UPDATE war_stats SET name = x.ign
+                           FROM unnest($1::text[], $2::text[]) AS x(tag, ign)
+                           WHERE war_stats.tag = x.tag
+                        """
+                await con.execute(query, tags, igns)
+
+        for tag, ign in changed:
+            self.bot.claims.rename(tag, ign)
+            self.bot.donation_cache.invalidate(claimed[tag].userid)
+
+        war_stats = self.bot.get_cog('WarStats')
+        if war_stats:
+            war_stats.invalidate_warstats_pages()
+
+        return changed, stats
+
 
 def setup(bot):
     bot.add_cog(Claim(bot))
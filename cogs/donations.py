@@ -19,10 +19,7 @@ class ShowDonations(commands.Cog):
             await ctx.show_help()
 
     async def donations_by_today(self):
-        query = "SELECT donationsbytoday FROM season WHERE toggle = $1"
-        dump = await self.bot.pool.fetchrow(query, True)
-
-        return dump['donationsbytoday']
+        return await self.bot.season.donations_by_today()
 
     @commands.command(aliases=['mydon'])
     async def don(self, ctx, mention: discord.Member=None):
@@ -34,61 +31,61 @@ class ShowDonations(commands.Cog):
         if not mention:
             mention = ctx.author
 
-        query = 'SELECT ign, tag, difference FROM claims WHERE userid = $1'
-        dump = await ctx.db.fetch(query, mention.id)
+        user = await self.bot.donation_cache.get(mention.id)
 
-        players = []
-        try:
-            players.extend(f'{ign} ({tag}): `{donations} donations` '
-                           for (index, (ign, tag, donations)) in enumerate(dump))
-        except TypeError:
-            players.append('__**No Accounts**__')
+        players = [f'{n.ign} ({n.tag}): `{n.difference} donations` ' for n in user.accounts] \
+            or ['__**No Accounts**__']
 
         pages = paginator.EmbedPag(ctx, entries=players, per_page=20, message=ctx.message)
         await pages.paginate(start_page=1)
 
+    async def clan_donations(self, ctx, clan):
+        per_page = 10
+
+        query = "SELECT COUNT(*) FROM claims WHERE clan = $1"
+        total = await ctx.db.fetchval(query, clan)
+
+        async def fetch(after):
+            # keyset pagination on (difference, tag) so we only ever read the page being shown
+            if after is None:
+                query = """SELECT userid, ign, tag, COALESCE(difference, 0) AS difference FROM claims
+                           WHERE clan = $1
+                           ORDER BY COALESCE(difference, 0), tag LIMIT $2
+                        """
+                dump = await self.bot.pool.fetch(query, clan, per_page)
+            else:
+                query = """SELECT userid, ign, tag, COALESCE(difference, 0) AS difference FROM claims
+                           WHERE clan = $1 AND (COALESCE(difference, 0), tag) > ($2, $3)
+                           ORDER BY COALESCE(difference, 0), tag LIMIT $4
+                        """
+                dump = await self.bot.pool.fetch(query, clan, after[0], after[1], per_page)
+
+            entries = [f'<@{n["userid"]}> {n["ign"]} ({n["tag"]}): `{n["difference"]} don`' for n in dump]
+            last = (dump[-1]['difference'], dump[-1]['tag']) if dump else after
+            return entries, last
+
+        title = f'Donations required by today: {await self.donations_by_today()}'
+        pages = paginator.KeysetEmbedPag(ctx, message=ctx.message, fetch=fetch, total=total,
+                                         per_page=per_page, title=title)
+        await pages.paginate(start_page=1)
+
     @commands.command()
     async def awdon(self, ctx):
         """Returns a pagination of donations for all members in AW
-        """
-        query = "SELECT userid, ign, tag, difference FROM claims WHERE clan = $1 ORDER BY userid ASC;"
-        dump = await ctx.db.fetch(query, 'Aussie Warriors')
-
-        unique_ids = set([n[0] for n in dump])  # unique list of discord id's so can group acc's by discord user
 
-        members = ['Donations required by today: ' + str(await self.donations_by_today())]
-        # list of each discord user after we have made our string
-
-        for user in unique_ids:
-            #  make string of accounts in format ign (tag): donation\n ...more accounts
-            string = '\n'.join(f'{n[1]} ({n[2]}): `{n[3]} don`' for n in dump if n[0] == user)
-            new_string = f'<@{user}>\n{string}'  # add the mention at top of string
-            members.append(new_string)  # add to our list of strings
-
-        pages = paginator.EmbedPag(ctx, entries=members, per_page=10, message=ctx.message)  # paginate it
-        await pages.paginate(start_page=1)
+        Accounts are listed one per line, lowest difference first, each with its owner's mention
+        (rather than grouped under each member), so only the page being shown is read.
+        """
+        await self.clan_donations(ctx, 'Aussie Warriors')
 
     @commands.command()
     async def a4wdon(self, ctx):
-        """Returns a pagination of donations for all members in AW
-        """
-
-        query = "SELECT userid, ign, tag, difference FROM claims WHERE clan = $1"
-        dump = await ctx.db.fetch(query, 'Aussies 4 War')
-
-        unique_ids = set([n[0] for n in dump])  # unique list of discord id's so can group acc's by discord user
-
-        members = ['Donations required by today: ' + str(await self.donations_by_today())]
-        # list of each discord user after we have made our string
+        """Returns a pagination of donations for all members in A4W
 
-        for user in unique_ids:
-            #  make string of accounts in format ign (tag): donation\n ...more accounts
-            string = '\n'.join(f'{n[1]} ({n[2]}): `{n[3]} don`' for n in dump if n[0] == user)
-            new_string = f'<@{user}>\n{string}'  # add the mention at top of string
-            members.append(new_string)  # add to our list of strings
-
-        pages = paginator.EmbedPag(ctx, entries=members, per_page=10, message=ctx.message)
-        await pages.paginate(start_page=1)
+        Accounts are listed one per line, lowest difference first, each with its owner's mention
+        (rather than grouped under each member), so only the page being shown is read.
+        """
+        await self.clan_donations(ctx, 'Aussies 4 War')
 
     @commands.command()
     async def avg(self, ctx, mention: discord.Member=None):
@@ -96,19 +93,12 @@ class ShowDonations(commands.Cog):
         Parameters: [user: mention, id or user#discrim]
         """
         if mention:
-            query = "SELECT userid, average FROM averages WHERE userid = $1"
-            dump = await ctx.db.fetch(query, mention.id)
+            users = [await self.bot.donation_cache.get(mention.id)]
+            users = [n for n in users if n.average is not None]
         else:
-            query = "SELECT userid, average FROM averages WHERE warning = $1"
-            dump = await ctx.db.fetch(query, True)
-
-        players = []
+            users = await self.bot.donation_cache.warnings()
 
-        try:
-            players.extend(f'<@{userid}>: `{avgdon} donations`'
-                           for (index, (userid, avgdon)) in enumerate(dump))
-        except TypeError:
-            players.append('No Accounts')
+        players = [f'<@{n.userid}>: `{n.average} donations`' for n in users] or ['No Accounts']
 
         pages = paginator.EmbedPag(ctx, entries=players, per_page=20, message=ctx.message)
         await pages.paginate(start_page=1)
@@ -149,13 +139,11 @@ class ShowDonations(commands.Cog):
         await ctx.message.add_reaction('\u2705')  # green tick emoji --> success
 
     async def send_donation_pings(self):
-        query = "SELECT userid, average FROM averages WHERE warning = $1"
-        dump = await self.bot.pool.fetch(query, True)
+        users = await self.bot.donation_cache.warnings()
 
-        players = '\n'.join(f'<@{userid}>: `{avgdon} donations`'
-                            for (index, (userid, avgdon)) in enumerate(dump) or 'No Accounts')
+        players = '\n'.join(f'<@{n.userid}>: `{n.average} donations`' for n in users) or 'No Accounts'
 
-        ping = ''.join(f'<@{row[0]}>, ' for row in dump)
+        ping = ''.join(f'<@{n.userid}>, ' for n in users)
 
         donations_by_today = await self.donations_by_today()
 
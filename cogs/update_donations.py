@@ -1,14 +1,24 @@
 import datetime
-import calendar
 import asyncio
+import time
 
 import discord
 from discord.ext import commands
-import pytz
+import coc
 
-from cogs.utils import checks, db
+from cogs.utils import checks, db, sweep, scheduler, buffer
 from cogs.donations import ShowDonations
-from cogs.admin import Admin
+from cogs.admin import TabularData
+
+
+class RolloverFailed(Exception):
+    """Raised when a new season can't be started because some accounts couldn't be fetched.
+    """
+    def __init__(self, tags, stats):
+        self.tags = tags
+        self.stats = stats
+        super().__init__(f'Could not fetch {len(tags)} accounts, the season has not been changed: '
+                         f'{", ".join(tags[:10])}{"..." if len(tags) > 10 else ""}')
 
 
 class Season(db.Table):
@@ -28,12 +38,34 @@ class Averages(db.Table):
 
 
 class Update(commands.Cog):
+    # max. number of player fetches in flight during a sweep. Kept low so we stay inside
+    # the throttling tier of a developer API key; override with `sweepConcurrency` in creds.json
+    SWEEP_CONCURRENCY = 10
+    # how long (seconds) donations seen in the home clan member lists are collected before those players
+    # are fetched, so an account donating all day is fetched once per interval; `donationTrackerInterval`
+    TRACKER_INTERVAL = 3600
+    # min. seconds between progress updates while starting a new season
+    PROGRESS_INTERVAL = 3
+    # how many more times accounts that couldn't be fetched are retried before a new season is abandoned
+    ROLLOVER_RETRIES = 2
+    ROLLOVER_RETRY_DELAY = 30
+
     def __init__(self, bot):
         self.bot = bot
+        # tag: utc time the tracker last wrote donations for that account
+        self.tracked = {}
+        # tag: in-game donations from the home clan member lists as of the last sweep
+        self.clan_donations = {}
 
-        self.auto_daily_task = bot.loop.create_task(self.auto_daily_updates())
-        self.auto_monthly_task = bot.loop.create_task(self.auto_monthly_update())
-        self.auto_pings_task = bot.loop.create_task(self.auto_send_pings())
+        self.bot.coc.add_events(function_dicts={'on_clan_member_donation': self.on_clan_member_donation})
+        self.donation_writer = buffer.BufferedWriter(bot.loop, self.track_donations, max_size=self.sweep_concurrency * 5,
+                                                     interval=self.tracker_interval)
+
+        self.scheduler = scheduler.Scheduler(bot, timezone='Australia/Sydney')
+        self.scheduler.add_job('daily_update', scheduler.daily(6), self.daily_update_job)
+        self.scheduler.add_job('monthly_update', scheduler.last_weekday_of_month(0, 5), self.monthly_update_job)
+        self.scheduler.add_job('send_pings', scheduler.daily(7, weekday=1), self.send_pings_job)
+        self.scheduler.start()
 
     async def cog_command_error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
@@ -45,9 +77,8 @@ class Update(commands.Cog):
             await ctx.show_help()
 
     def cog_unload(self):
-        self.auto_daily_task.cancel()
-        self.auto_monthly_task.cancel()
-        self.auto_pings_task.cancel()
+        self.scheduler.stop()
+        self.donation_writer.close()
 
     @commands.command()
     @checks.is_leader()
@@ -58,6 +89,19 @@ class Update(commands.Cog):
         await self.update_donations_by_today()
         await ctx.message.add_reaction('\u2705')
 
+    @commands.command()
+    async def jobs(self, ctx):
+        """Shows when the scheduled donation jobs last ran and when they will next run (Sydney time)
+        """
+        def fmt(dt):
+            return dt.strftime('%a %d %b %H:%M') if dt else 'Never'
+
+        table = TabularData()
+        table.set_columns(['Job', 'Last Run', 'Next Run'])
+        table.add_rows([job.name, fmt(job.last_run), fmt(job.next_run)] for job in self.scheduler.jobs.values())
+
+        await ctx.send(f'```\n{table.render()}\n```')
+
     @commands.command(name='refavg')
     @checks.is_leader()
     @checks.mod_commands()
@@ -72,14 +116,17 @@ class Update(commands.Cog):
     @commands.command(name='upd')
     @checks.is_leader()
     @checks.mod_commands()
-    async def _update(self, ctx):
+    async def _update(self, ctx, full: bool = False):
         """Manually update the donations of all accounts in the database
 
+        Pass `true` to fetch every player, rather than only those whose donations have changed in the clan lists.
+
         [Requires `manage_server` permissions]
         """
-        await self.update()
+        stats = await self.update(full=full)
         await self.update_donations_by_today()
         await ctx.message.add_reaction('\u2705')
+        await ctx.send(f'Updated {stats}')
 
     @commands.command()
     async def myupd(self, ctx):
@@ -100,212 +147,363 @@ class Update(commands.Cog):
     async def manual_reset(self, ctx):
         """Manually resets the season of donations in the database
         """
-        query = "UPDATE season SET toggle = $1"
-        await ctx.db.execute(query, False)
+        msg = await ctx.send('Starting a new season...')
 
-        query = "SELECT tag FROM claims"
-        dump = await ctx.db.fetch(query)
+        async def progress(done, total):
+            await msg.edit(content=f'Starting a new season... fetched {done}/{total} accounts')
 
-        await self.new_month()
-
-        for tag in dump:
-            print(tag['tag'])
-            await self.download_starting_donations(tag['tag'])
+        try:
+            stats, missing = await self.season_rollover(progress=progress)
+        except RolloverFailed as e:
+            return await msg.edit(content=str(e))
 
-        await self.refresh_avg()
+        await msg.edit(content=f'New season started: {stats}{self.missing_fmt(missing)}')
         await ctx.message.add_reaction('\u2705')
 
-    async def donations_by_today(self):
-        query = "SELECT donationsbytoday FROM season WHERE toggle = $1"
-        dump = await self.bot.pool.fetchrow(query, True)
+    @staticmethod
+    def missing_fmt(missing):
+        if not missing:
+            return ''
+        return f'\nNot found (starting donations left as they were): {", ".join(missing)}'
 
-        return dump['donationsbytoday']
+    async def donations_by_today(self):
+        return await self.bot.season.donations_by_today()
 
     async def update_donations_by_today(self):
-        query = "SELECT start_date FROM season WHERE toggle = $1"
-        dump = await self.bot.pool.fetchrow(query, True)
+        season = await self.bot.season.get()
 
         day_of_year = datetime.datetime.utcnow().strftime('%j')
-        date_difference = int(day_of_year) - dump['start_date']
+        date_difference = int(day_of_year) - season.start_date
         donations_required = date_difference * 13.33
 
         query = "UPDATE season SET donationsbytoday = $1 WHERE toggle = $2"
         await self.bot.pool.execute(query, donations_required, True)
+        self.bot.season.invalidate()
 
-    async def new_month(self):
-        dayofyear = int(datetime.datetime.now().strftime('%j'))
+    async def season_rollover(self, progress=None):
+        """Starts a new donation season.
+
+        Everyone's starting donations are fetched concurrently, then the old season is closed,
+        the new one opened and all starting donations stored in a single transaction.
+        Accounts that can't be fetched (rate limits, server errors, timeouts) are retried, and if any
+        still fail nothing is changed and :exc:`RolloverFailed` is raised. Tags the API doesn't know
+        (banned or deleted accounts) won't ever succeed, so they are skipped instead.
 
-        query = "INSERT INTO season (toggle, donationsbytoday, start_date) VALUES ($1, $2, $3)"
-        await self.bot.pool.execute(query, True, 13.3, dayofyear)
+        ``progress`` is an optional coroutine taking (done, total), called every few seconds.
 
-    async def new_avg(self, user_id):
-        query = "SELECT SUM(difference), COUNT(*) FROM claims WHERE userid = $1"
-        dump = await self.bot.pool.fetchrow(query, user_id)
+        Returns a tuple of (SweepStats, [tags that weren't found]).
+        """
+        query = "SELECT tag FROM claims"
+        dump = await self.bot.pool.fetch(query)
+        tags = [n['tag'] for n in dump]
 
-        average_donations = dump['sum'] / dump['count']
+        stats = sweep.SweepStats()
+        starting = {}
+        last_progress = time.monotonic()
+        missing = []
 
-        if average_donations >= 0:
-            warn = False
+        async def fetch(tag):
+            try:
+                return await self.bot.coc.get_player(tag)
+            except coc.NotFound:
+                missing.append(tag)
+                return None
+
+        to_fetch = tags
+        for attempt in range(self.ROLLOVER_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(self.ROLLOVER_RETRY_DELAY)
+                stats.failed.clear()
+
+            async for tag, player in sweep.fetch_many(to_fetch, fetch,
+                                                      limit=self.sweep_concurrency,
+                                                      errors=(coc.HTTPException, asyncio.TimeoutError),
+                                                      stats=stats):
+                if player is not None:
+                    achievement = player.achievements_dict.get('Friend in Need')
+                    # no achievement yet means they haven't donated anything
+                    starting[tag] = achievement.value if achievement else 0
+
+                if progress and time.monotonic() - last_progress > self.PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    await progress(len(starting), len(tags))
+
+            to_fetch = [n for n in tags if n not in starting and n not in missing]
+            if not to_fetch:
+                break
         else:
-            warn = True
+            # their starting donations would be last season's, counting that whole season again
+            raise RolloverFailed(to_fetch, stats.finish())
 
-        query = "INSERT INTO averages (userid, average, warning) VALUES($1, $2, $3)"
-        await self.bot.pool.execute(query, user_id, average_donations, warn)
+        dayofyear = int(datetime.datetime.now().strftime('%j'))
 
-    async def download_starting_donations(self, tag):
-        player = await self.bot.coc.get_player(tag)
+        async with self.bot.pool.acquire() as con:
+            async with con.transaction():
+                query = "UPDATE season SET toggle = $1"
+                await con.execute(query, False)
 
-        try:
-            donations = player.achievements_dict.get('Friend in Need').value
-        except AttributeError:
-            print('not ok')
-            return
+                query = "INSERT INTO season (toggle, donationsbytoday, start_date) VALUES ($1, $2, $3)"
+                await con.execute(query, True, 13.3, dayofyear)
+
+                query = """
+                        UPDATE claims SET starting_donations=x.don
+                        FROM unnest($1::text[], $2::int[]) AS x(tag, don)
+                        WHERE claims.tag=x.tag
+                        """
+                await con.execute(query, list(starting.keys()), list(starting.values()))
 
-        query = "UPDATE claims SET starting_donations=$1 WHERE tag=$2"
-        await self.bot.pool.execute(query, donations, tag)
+        self.bot.season.invalidate()
+        # anything we knew about current donations was relative to last season's starting point
+        self.tracked.clear()
+        self.clan_donations.clear()
+
+        await self.refresh_avg()
+        stats.skipped = len(missing)
+        return stats.finish(), missing
 
     async def refresh_avg(self):
-        query = "DROP TABLE averages"
-        await self.bot.pool.execute(query)
+        """Recalculates the averages table in one transaction.
+        Readers keep seeing the old averages until it commits, rather than an empty table.
+        """
+        # the average covers all of a user's accounts, as long as one of them is in AW or A4W
+        query = """
+                INSERT INTO averages (userid, average, warning)
+                SELECT userid, SUM(difference) / COUNT(*), SUM(difference) / COUNT(*) < 0
+                FROM claims
+                WHERE userid IN (
+                    SELECT userid FROM claims WHERE clan = 'Aussie Warriors' OR clan = 'Aussies 4 War'
+                )
+                GROUP BY userid
+                """
+        async with self.bot.pool.acquire() as con:
+            async with con.transaction():
+                await con.execute("DELETE FROM averages")
+                await con.execute(query)
+
+        # the sweep has just changed everyone's rows, so get the donation commands' copy ready now
+        await self.bot.donation_cache.load()
 
+    async def refresh_user_avg(self, con, user_id):
+        """Recalculates the average for a single user, on a connection that is already in a transaction.
+        """
         query = """
-                CREATE TABLE IF NOT EXISTS averages 
-                (id SERIAL PRIMARY KEY, userid BIGINT, average NUMERIC, warning BOOLEAN);
+                INSERT INTO averages (userid, average, warning)
+                SELECT userid, SUM(difference) / COUNT(*), SUM(difference) / COUNT(*) < 0
+                FROM claims
+                WHERE userid = $1 AND userid IN (
+                    SELECT userid FROM claims WHERE clan = 'Aussie Warriors' OR clan = 'Aussies 4 War'
+                )
+                GROUP BY userid
                 """
-        await self.bot.pool.execute(query)
+        await con.execute("DELETE FROM averages WHERE userid = $1", user_id)
+        await con.execute(query, user_id)
 
-        query = "SELECT DISTINCT userid FROM claims WHERE clan = 'Aussie Warriors' or clan = 'Aussies 4 War'"
-        dump = list(await self.bot.pool.fetch(query))
+    async def update_database(self, rows):
+        """Writes a list of (donations, difference, clan, tag) rows back to claims
+        in a single statement, so a sweep is either stored completely or not at all.
+        """
+        if not rows:
+            return
 
-        for row in dump:
-            await self.new_avg(row['userid'])
+        don, dif, clan, tag = (list(n) for n in zip(*rows))
 
-    async def update_database(self, don, dif, clan, tag):
         query = """
                 UPDATE claims SET 
-                current_donations=$1,
-                difference=$2, 
-                clan=$3 
-                WHERE tag=$4
+                current_donations=x.don,
+                difference=x.dif, 
+                clan=x.clan 
+                FROM unnest($1::int[], $2::numeric[], $3::text[], $4::text[]) AS x(don, dif, clan, tag)
+                WHERE claims.tag=x.tag
                 """
-        await self.bot.pool.execute(query, don, dif, clan, tag)
+        async with self.bot.pool.acquire() as con:
+            async with con.transaction():
+                await con.execute(query, don, dif, clan, tag)
+
+    @property
+    def sweep_concurrency(self):
+        return int(self.bot.loaded.get('sweepConcurrency', self.SWEEP_CONCURRENCY))
+
+    def donation_row(self, individual, player, season):
+        """Works out the (donations, difference, clan, tag) row to store for a claimed account.
+        Returns ``None`` if the player doesn't have a `Friend in Need` achievement to read.
+        """
+        try:
+            current_donations = player.achievements_dict.get('Friend in Need').value
+        except AttributeError:
+            return None
+
+        donations_this_season = current_donations - individual['starting_donations']
+        donations_required_difference = donations_this_season - season.donations_by_today
+
+        try:
+            clan = player.clan.name
+        except AttributeError:
+            clan = ''
+
+        return donations_this_season, donations_required_difference, clan, individual['tag']
+
+    async def sweep(self, dump):
+        """Fetches players for every claims row in `dump` concurrently,
+        then writes all of the accounts back to the database in one go.
+        """
+        stats = sweep.SweepStats()
+        season = await self.bot.season.get()  # constant for the whole sweep, so only look it up once
+        rows = {n['tag']: n for n in dump}
+        to_write = []
+
+        async for tag, player in sweep.fetch_many(rows.keys(), self.bot.coc.get_player,
+                                                  limit=self.sweep_concurrency,
+                                                  errors=(coc.HTTPException, asyncio.TimeoutError),
+                                                  stats=stats):
+            if player is None:
+                continue
+
+            row = self.donation_row(rows[tag], player, season)
+            if not row:
+                # one account without the achievement shouldn't stop everyone else updating
+                stats.failed.append(tag)
+                continue
+
+            to_write.append(row)
+
+        await self.update_database(to_write)
+        return stats.finish()
+
+    @property
+    def tracker_interval(self):
+        return int(self.bot.loaded.get('donationTrackerInterval', self.TRACKER_INTERVAL))
+
+    def fresh_tags(self, within=datetime.timedelta(days=1)):
+        """Tags the tracker has written donations for recently enough that a sweep needn't fetch them.
+        """
+        cutoff = datetime.datetime.utcnow() - within
+        return {tag for tag, when in self.tracked.items() if when > cutoff}
+
+    async def on_clan_member_donation(self, old_donations, new_donations, member, clan):
+        # from the home clan updates (see AWBot.start_coc_updates); no claimed player is polled on its own
+        if new_donations <= old_donations:
+            return  # the in-game count resets every season, `Friend in Need` doesn't
+
+        await self.bot.claims.ensure_loaded()
+        if self.bot.claims.get(member.tag):
+            self.donation_writer.add(member.tag)
+
+    async def track_donations(self, tags):
+        """Fetches the claimed accounts whose clan donations have moved and stores their donations and averages.
+        """
+        query = "SELECT tag, starting_donations, userid FROM claims WHERE tag = ANY($1::text[])"
+        dump = await self.bot.pool.fetch(query, list(set(tags)))
+
+        stats = await self.sweep(dump)
+        failed = set(stats.failed)
+
+        user_ids = {n['userid'] for n in dump if n['tag'] not in failed}
+        async with self.bot.pool.acquire() as con:
+            async with con.transaction():
+                for user_id in user_ids:
+                    await self.refresh_user_avg(con, user_id)
+
+        now = datetime.datetime.utcnow()
+        self.tracked.update((n['tag'], now) for n in dump if n['tag'] not in failed)
+        for user_id in user_ids:
+            self.bot.donation_cache.invalidate(user_id)
 
     async def my_upd(self, user_id):
         query = "SELECT tag, starting_donations FROM claims WHERE userid = $1"
         dump = await self.bot.pool.fetch(query, user_id)
 
-        for individual in dump:
-            player = await self.bot.coc.get_player(individual['tag'])
+        stats = await self.sweep(dump)
+        self.bot.donation_cache.invalidate(user_id)
+        return stats
 
-            try:
-                current_donations = player.achievements_dict.get('Friend in Need').value
-            except AttributeError:
-                print('not ok')
-                break
-
-            donations_this_season = current_donations - individual['starting_donations']
-            donations_required_difference = donations_this_season - (await self.donations_by_today())
+    async def home_clan_members(self):
+        """Returns {tag: (clan name, donations)} for everyone in AW and A4W, in 2 API calls.
+        """
+        members = {}
 
+        for clan_tag in (self.bot.AW_CLAN_TAG, self.bot.A4W_CLAN_TAG):
             try:
-                clan = player.clan.name
-            except AttributeError:
-                clan = ''
+                clan = await self.bot.coc.get_clan(clan_tag)
+            except (coc.HTTPException, asyncio.TimeoutError):
+                continue  # their members will just get a full player fetch instead
 
-            await self.update_database(donations_this_season, donations_required_difference, clan, individual['tag'])
+            members.update({n.tag: (clan.name, n.donations) for n in clan.members})
 
-    async def update(self):
-        query = "SELECT tag, starting_donations FROM claims"
-        dump = await self.bot.pool.fetch(query)
+        return members
 
-        for individual in dump:
-            player = await self.bot.coc.get_player(individual['tag'])
+    async def carry_forward(self, resolved):
+        """Moves difference along with donations by today for accounts that weren't fetched this sweep.
 
-            try:
-                current_donations = player.achievements_dict.get('Friend in Need').value
-            except AttributeError:
-                print('not ok')
-                break
+        ``resolved`` maps tag -> clan name, or ``None`` to leave the stored clan as it is.
+        """
+        if not resolved:
+            return
 
-            donations_this_season = current_donations - individual['starting_donations']
-            donations_required_difference = donations_this_season - (await self.donations_by_today())
+        season = await self.bot.season.get()
+        query = """
+                UPDATE claims SET 
+                difference=claims.current_donations - $1,
+                clan=COALESCE(x.clan, claims.clan)
+                FROM unnest($2::text[], $3::text[]) AS x(tag, clan)
+                WHERE claims.tag=x.tag
+                """
+        await self.bot.pool.execute(query, season.donations_by_today, list(resolved.keys()), list(resolved.values()))
 
-            try:
-                clan = player.clan.name
-            except AttributeError:
-                clan = ''
+    async def update(self, full=False):
+        query = "SELECT tag, starting_donations FROM claims"
+        dump = await self.bot.pool.fetch(query)
 
-            await self.update_database(donations_this_season, donations_required_difference, clan, individual['tag'])
+        # accounts the tracker has seen today already have current donations,
+        # they only need their difference moved along with donations by today
+        fresh = self.fresh_tags()
+        resolved = dict.fromkeys(fresh)
+        to_fetch = [n for n in dump if n['tag'] not in fresh]
 
-        await self.refresh_avg()
+        if not full:
+            members = await self.home_clan_members()
+            to_fetch, by_clan = sweep.split_by_clan(to_fetch, members, self.clan_donations)
+            resolved.update(by_clan)
+            self.clan_donations = {tag: n[1] for tag, n in members.items()}
 
-    async def auto_daily_updates(self):
-        try:
-            while not self.bot.is_closed():
-                await self.bot.get_cog('Admin').task_stats('daily_update', False)
+        stats = await self.sweep(to_fetch)
+        stats.skipped = len(resolved)
 
-                now = datetime.datetime.now(pytz.timezone('Australia/Sydney'))
+        for tag in stats.failed:
+            # make sure we try these again next time, even if their clan donations haven't moved
+            self.clan_donations.pop(tag, None)
 
-                if now.hour == 6:  # if its 6oc
-                    await self.update_donations_by_today()
-                    await self.update()
-                    await self.refresh_avg()
-                    await (self.bot.get_channel(self.bot.info_channel_id)).send('auto-daily-update done')
-                    await self.bot.get_cog('Admin').task_stats('daily_update', True)
+        await self.carry_forward(resolved)
+        await self.refresh_avg()
+        return stats
 
-                await asyncio.sleep(3600)  # sleep for an hour
+    async def daily_update_job(self):
+        await self.update_donations_by_today()
+        stats = await self.update()
+        await (self.bot.get_channel(self.bot.info_channel_id)).send(f'auto-daily-update done\n{stats}')
+        await self.bot.get_cog('Admin').task_stats('daily_update', True)
 
-        except asyncio.CancelledError:
-            pass
-        except (OSError, discord.ConnectionClosed):
-            self.auto_daily_task.cancel()
-            self.auto_daily_task = self.bot.loop.create_task(self.auto_daily_updates())
+    async def monthly_update_job(self):
+        channel = self.bot.get_channel(self.bot.info_channel_id)
 
-    async def auto_monthly_update(self):
-        try:
-            while not self.bot.is_closed():
-                await self.bot.get_cog('Admin').task_stats('monthly_update', False)
-                # there is probably a more elegant way of finding the last monday of the month date
-                cal = calendar.Calendar(0)
-                month = cal.monthdatescalendar(datetime.date.today().year, datetime.date.today().month)
-                lastweek = month[-1]
-                monday = lastweek[0]
-
-                if datetime.date.today() == monday:  # if its the last monday of the month
-                    await self.manual_reset()
-                    await self.update_donations_by_today()
-                    await self.update()
-                    await self.refresh_avg()
-                    await (self.bot.get_channel(self.bot.info_channel_id)).send('auto-monthly-update done')
-
-                    await self.bot.get_cog('Admin').task_stats('monthly_update', True)
-
-                await asyncio.sleep(86399)  # sleep for a second less than a day
-        except asyncio.CancelledError:
-            pass
-        except (OSError, discord.ConnectionClosed):
-            self.auto_daily_task.cancel()
-            self.auto_daily_task = self.bot.loop.create_task(self.auto_daily_updates())
-
-    async def auto_send_pings(self):
         try:
-            while not self.bot.is_closed():
-                await self.bot.get_cog('Admin').task_stats('send_pings', False)
-
-                show_donations_class = ShowDonations(self.bot)
-                today = datetime.datetime.now(pytz.timezone('Australia/Sydney'))
+            rollover, missing = await self.season_rollover()
+        except RolloverFailed as e:
+            await channel.send(f'auto-monthly-update failed\n{e}\n{e.stats}')
+            await self.bot.get_cog('Admin').task_stats('monthly_update', False)
+            raise  # not stored as a run, so it is tried again if we restart
 
-                if today.hour == 7 and today.weekday() == 1:  # if its 7oc on tuesday
-                    if self.bot.send_pings == 'true':
-                        await show_donations_class.send_donation_pings()
-                        await self.bot.get_cog('Admin').task_stats('send_pings', True)
+        await self.update_donations_by_today()
+        stats = await self.update()
+        await channel.send(f'auto-monthly-update done\nNew season: {rollover}{self.missing_fmt(missing)}\n'
+                           f'Update: {stats}')
+        await self.bot.get_cog('Admin').task_stats('monthly_update', True)
 
-                await asyncio.sleep(3600)  # sleep for an hour
+    async def send_pings_job(self):
+        if self.bot.send_pings != 'true':
+            return
 
-        except asyncio.CancelledError:
-            pass
-        except (OSError, discord.ConnectionClosed):
-            await self.auto_daily_task.cancel()
-            self.auto_daily_task = self.bot.loop.create_task(self.auto_daily_updates())
+        await ShowDonations(self.bot).send_donation_pings()
+        await self.bot.get_cog('Admin').task_stats('send_pings', True)
 
 
 def setup(bot):
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    """Collects items and hands them to the `flush` coroutine in batches.
+
+    A batch is written once `max_size` items have built up, or `interval` seconds after the first item
+    of the batch arrived, whichever comes first. If a write fails the items are kept for the next one.
+    """
+    def __init__(self, loop, flush, *, max_size=50, interval=5):
+        self.loop = loop
+        self.max_size = max_size
+        self.interval = interval
+        self._flush = flush
+        self._items = []
+        self._timer = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item):
+        self._items.append(item)
+
+        if len(self._items) >= self.max_size:
+            self.loop.create_task(self.flush())
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self.interval, lambda: self.loop.create_task(self.flush()))
+
+    async def flush(self):
+        """Writes everything buffered so far, returning how many items were written.
+        """
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            items, self._items = self._items, []
+            if not items:
+                return 0
+
+            try:
+                await self._flush(items)
+            except asyncio.CancelledError:
+                self._items[:0] = items
+                raise
+            except Exception:
+                log.exception('Failed to write %s buffered items, will retry', len(items))
+                self._items[:0] = items
+                if self._timer is None:
+                    self._timer = self.loop.call_later(self.interval, lambda: self.loop.create_task(self.flush()))
+                return 0
+
+            return len(items)
+
+    def close(self):
+        """Stops the timer and writes anything left in the background.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._items:
+            self.loop.create_task(self.flush())
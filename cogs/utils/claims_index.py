@@ -0,0 +1,114 @@
+import asyncio
+import difflib
+
+
+def normalize(ign):
+    """Casefolds an IGN and collapses its whitespace, so `Maths  Man` and `maths man` are the same key.
+    """
+    return ' '.join(ign.casefold().split())
+
+
+class ClaimedAccount:
+    __slots__ = ('tag', 'ign', 'userid')
+
+    def __init__(self, tag, ign, userid):
+        self.tag = tag
+        self.ign = ign
+        self.userid = userid
+
+
+class ClaimsIndex:
+    """An in memory copy of who has claimed what, keyed by tag, by (normalized) IGN and by discord user.
+
+    It's loaded in one query, and everything in `cogs/claim.py` that writes to `claims` updates it
+    as well, so claim lookups don't need to go to the database. Tags are matched case insensitively.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self._tags = None  # tag: ClaimedAccount
+        self._igns = {}  # normalized ign: {tags}
+        self._users = {}  # userid: {tags}
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self):
+        return self._tags is not None
+
+    async def load(self):
+        async with self._lock:
+            dump = await self.bot.pool.fetch("SELECT tag, ign, userid FROM claims")
+
+            self._tags = {}
+            self._igns.clear()
+            self._users.clear()
+            for record in dump:
+                self._insert(ClaimedAccount(record['tag'], record['ign'], record['userid']))
+
+    async def ensure_loaded(self):
+        if self._tags is None:
+            await self.load()
+
+    def _insert(self, account):
+        key = account.tag.upper()
+        self._tags[key] = account
+        self._igns.setdefault(normalize(account.ign or ''), set()).add(key)
+        self._users.setdefault(account.userid, set()).add(key)
+
+    @staticmethod
+    def _discard(mapping, key, tag):
+        tags = mapping.get(key)
+        if tags is not None:
+            tags.discard(tag)
+            if not tags:
+                del mapping[key]
+
+    def get(self, tag):
+        return self._tags.get(tag.upper())
+
+    def by_ign(self, ign):
+        return [self._tags[n] for n in self._igns.get(normalize(ign), ())]
+
+    def by_user(self, user_id):
+        return sorted((self._tags[n] for n in self._users.get(user_id, ())), key=lambda n: n.ign or '')
+
+    def accounts(self):
+        return list(self._tags.values())
+
+    def resolve(self, tag_or_ign):
+        """Returns the claimed accounts matching a tag (if it starts with #) or an IGN.
+        """
+        if tag_or_ign.startswith('#'):
+            account = self.get(tag_or_ign)
+            return [account] if account else []
+        return self.by_ign(tag_or_ign)
+
+    def close_matches(self, ign, n=3, cutoff=0.6):
+        """Returns up to `n` claimed IGNs that look like `ign`, best match first.
+        """
+        matches = difflib.get_close_matches(normalize(ign), self._igns.keys(), n=n, cutoff=cutoff)
+        return [self._tags[next(iter(self._igns[key]))].ign for key in matches]
+
+    def add(self, tag, ign, user_id):
+        if self._tags is None:
+            return  # it'll be in there once we load
+
+        self.remove(tag)
+        self._insert(ClaimedAccount(tag, ign, user_id))
+
+    def remove(self, tag):
+        if self._tags is None:
+            return
+
+        key = tag.upper()
+        account = self._tags.pop(key, None)
+        if account is not None:
+            self._discard(self._igns, normalize(account.ign or ''), key)
+            self._discard(self._users, account.userid, key)
+
+    def rename(self, tag, ign):
+        if self._tags is None:
+            return
+
+        account = self.get(tag)
+        if account is not None:
+            self.add(account.tag, ign, account.userid)
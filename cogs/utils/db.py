@@ -112,7 +112,7 @@ class Datetime(SQLType):
 
     def to_sql(self):
         if self.timezone:
-            return 'TIMESTAMP WITH TIMEZONE'
+            return 'TIMESTAMP WITH TIME ZONE'
         return 'TIMESTAMP'
 
 
@@ -452,9 +452,22 @@ class SchemaDiff:
                 fmt = 'ALTER COLUMN {0[name]} SET NOT NULL'.format(constraints)
                 sub_statements.append(fmt)
 
+        added_statements = []
+        added_indexes = []
         for added in path.get('add_columns', []):
             column = Column.from_dict(added)
-            sub_statements.append('ADD COLUMN ' + column._create_table())
+            added_statements.append('ADD COLUMN ' + column._create_table())
+            if column.index:
+                added_indexes.append({'name': column.name, 'index': column.index_name})
+
+        backfill = path.get('backfill', [])
+        if backfill:
+            # new columns have to exist (and old ones still be around) while they're filled in
+            if added_statements:
+                statements.append(base + ', '.join(added_statements) + ';')
+            statements.extend(backfill)
+        else:
+            sub_statements.extend(added_statements)
 
         if sub_statements:
             statements.append(base + ', '.join(sub_statements) + ';')
@@ -463,7 +476,7 @@ class SchemaDiff:
         for dropped in path.get('drop_index', []):
             statements.append('DROP INDEX IF EXISTS {0[index]};'.format(dropped))
 
-        for added in path.get('add_index', []):
+        for added in path.get('add_index', []) + added_indexes:
             fmt = 'CREATE INDEX IF NOT EXISTS {0[index]} ON {1.__tablename__} ({0[name]});'
             statements.append(fmt.format(added, self.table))
 
@@ -655,7 +668,8 @@ class Table(metaclass=TableMeta):
             sql = diff.to_sql(downgrade=downgrade)
             if verbose:
                 print(sql)
-            await con.execute(sql)
+            async with con.transaction():
+                await con.execute(sql)
 
         current = directory.with_name('current-' + p.name)
         with current.open('w', encoding='utf-8') as fp:
@@ -730,7 +744,8 @@ class Table(metaclass=TableMeta):
             sql = diff.to_sql()
             if verbose:
                 print(sql)
-            await con.execute(sql)
+            async with con.transaction():
+                await con.execute(sql)
 
         # load the migration data
         with p.open('r', encoding='utf-8') as fp:
@@ -907,6 +922,10 @@ class Table(metaclass=TableMeta):
             after:
                 nullable: Optional[bool]
                 default: Optional[str]
+        backfill:
+            str [SQL run after new columns are added and before old ones are dropped,
+                 built from the table's ``__backfill__`` dict of column name -> SQL expression,
+                 after any statements in its ``__backfill_setup__`` dict of column name -> SQL]
         """
         upgrade = {}
         downgrade = {}
@@ -1012,6 +1031,14 @@ class Table(metaclass=TableMeta):
             upgrade.setdefault('remove_columns', []).extend(removed)
             downgrade.setdefault('add_columns', []).extend(removed)
 
+        backfill = getattr(self, '__backfill__', {})
+        setup = getattr(self, '__backfill_setup__', {})
+        filled = [c['name'] for c in upgrade.get('add_columns', []) if c['name'] in backfill]
+        if filled:
+            assignments = ', '.join('%s = %s' % (name, backfill[name]) for name in filled)
+            upgrade['backfill'] = [setup[name] for name in filled if name in setup]
+            upgrade['backfill'].append('UPDATE %s SET %s;' % (self.__tablename__, assignments))
+
         return SchemaDiff(self, upgrade, downgrade)
 
 
@@ -0,0 +1,102 @@
+import asyncio
+
+
+class Account:
+    __slots__ = ('userid', 'ign', 'tag', 'difference', 'clan')
+
+    def __init__(self, record):
+        self.userid = record['userid']
+        self.ign = record['ign']
+        self.tag = record['tag']
+        self.difference = record['difference']
+        self.clan = record['clan']
+
+
+class UserDonations:
+    """Everything the donation commands show for a single discord user.
+    """
+    __slots__ = ('userid', 'accounts', 'average', 'warning')
+
+    def __init__(self, userid):
+        self.userid = userid
+        self.accounts = []
+        self.average = None
+        self.warning = False
+
+
+class DonationCache:
+    """A read-through, in memory copy of the `claims` and `averages` rows each user's donation commands need.
+
+    The whole thing is loaded in 2 queries (the donation sweep reloads it once it's done),
+    and anything that changes a user's claims or average should call :meth:`invalidate` with their id.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self._users = None
+        self._stale = set()
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        async with self._lock:
+            query = "SELECT userid, ign, tag, difference, clan FROM claims"
+            claims = await self.bot.pool.fetch(query)
+
+            query = "SELECT userid, average, warning FROM averages"
+            averages = await self.bot.pool.fetch(query)
+
+            self._users = self._build(claims, averages)
+            self._stale.clear()
+
+    async def _load_user(self, user_id):
+        query = "SELECT userid, ign, tag, difference, clan FROM claims WHERE userid = $1"
+        claims = await self.bot.pool.fetch(query, user_id)
+
+        query = "SELECT userid, average, warning FROM averages WHERE userid = $1"
+        averages = await self.bot.pool.fetch(query, user_id)
+
+        self._users.pop(user_id, None)
+        self._users.update(self._build(claims, averages))
+        self._stale.discard(user_id)
+
+    @staticmethod
+    def _build(claims, averages):
+        users = {}
+
+        for record in claims:
+            user = users.setdefault(record['userid'], UserDonations(record['userid']))
+            user.accounts.append(Account(record))
+
+        for record in averages:
+            user = users.setdefault(record['userid'], UserDonations(record['userid']))
+            user.average = record['average']
+            user.warning = record['warning']
+
+        return users
+
+    async def _ensure_loaded(self):
+        if self._users is None:
+            await self.load()
+
+        for user_id in list(self._stale):
+            await self._load_user(user_id)
+
+    async def get(self, user_id):
+        """Returns the :class:`UserDonations` for a user.
+        """
+        await self._ensure_loaded()
+        return self._users.get(user_id) or UserDonations(user_id)
+
+    async def warnings(self):
+        """Returns a list of :class:`UserDonations` for everyone whose average is under the requirement.
+        """
+        await self._ensure_loaded()
+        return [user for user in self._users.values() if user.warning]
+
+    def invalidate(self, user_id=None):
+        """Marks a user's rows as changed, or drops everything if no user is given.
+        """
+        if user_id is None:
+            self._users = None
+            self._stale.clear()
+        elif self._users is not None:
+            self._stale.add(user_id)
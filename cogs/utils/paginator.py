@@ -381,3 +381,52 @@ class EmbedPag:
             await self.match()
 
 
+class KeysetEmbedPag(EmbedPag):
+    """An EmbedPag that fetches each page as it is shown, rather than being given every entry up front.
+
+    ``fetch`` is a coroutine taking the key of the last entry on the previous page (``None`` for the first page)
+    and returning a tuple of (entries, key of the last entry). Only the pages either side of the current one
+    are kept, and the next page is fetched in the background while the current one is being read.
+    """
+
+    def __init__(self, ctx, *, message, fetch, total, per_page, title=None):
+        # entries is only used for its length (in the footer), pages come from `fetch`
+        super().__init__(ctx, message=message, entries=range(total), per_page=per_page)
+        self.fetch = fetch
+        self.maximum_pages = max(self.maximum_pages, 1)
+        self.embed.title = title
+        self._pages = {}
+        self._after = {1: None}  # page: key of the last entry before it
+        self._lock = asyncio.Lock()
+        self._prefetch = None
+
+    async def load_page(self, page):
+        async with self._lock:
+            # walk forward from the closest page we know the start of; keys are tiny so we keep all of them
+            known = max(n for n in self._after if n <= page)
+            for n in range(known, page + 1):
+                if n not in self._pages:
+                    entries, last = await self.fetch(self._after[n])
+                    self._pages[n] = entries
+                    self._after[n + 1] = last
+
+            return self._pages[page]
+
+    def get_page(self, page):
+        return self._pages.get(page, [])
+
+    async def show_page(self, page, *, first=False):
+        await self.load_page(page)
+        self._pages = {n: e for n, e in self._pages.items() if abs(n - page) <= 1}
+
+        if page < self.maximum_pages and (page + 1) not in self._pages:
+            self._prefetch = self.bot.loop.create_task(self.load_page(page + 1))
+
+        await super().show_page(page, first=first)
+
+    async def paginate(self, start_page=1):
+        try:
+            await super().paginate(start_page=start_page)
+        finally:
+            if self._prefetch:
+                self._prefetch.cancel()
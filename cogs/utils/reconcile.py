@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+
+class RoleChange:
+    __slots__ = ('user_id', 'member', 'add')
+
+    def __init__(self, user_id, member, add):
+        self.user_id = user_id
+        self.member = member  # None if they aren't in the server
+        self.add = add
+
+    def __repr__(self):
+        return f'<RoleChange user_id={self.user_id} add={self.add}>'
+
+
+class ReconcileResult:
+    """What happened when applying a set of role changes.
+    """
+    def __init__(self):
+        self.applied = []
+        self.failed = []  # (change, exception or None if they aren't in the server)
+        self.retries = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def __str__(self):
+        return (f'{len(self.applied)} role changes in {self.elapsed:.1f}s, '
+                f'{len(self.failed)} failed, {self.retries} retries')
+
+
+def plan(desired, holders, get_member):
+    """Works out the role changes to get from the user ids holding a role (`holders`) to `desired`.
+    """
+    changes = [RoleChange(n, get_member(n), True) for n in desired - holders]
+    changes.extend(RoleChange(n, get_member(n), False) for n in holders - desired)
+    return changes
+
+
+async def apply(changes, run, *, limit=5, retries=3, retry_delay=None):
+    """Runs ``run(change)`` for every change with at most ``limit`` in flight.
+
+    If it raises, ``retry_delay(exception, attempt)`` gives the seconds to wait before trying again,
+    or ``None`` if the error isn't worth retrying. Changes for members who aren't in the server fail straight away.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    result = ReconcileResult()
+
+    async def worker(change):
+        if change.member is None:
+            result.failed.append((change, None))
+            return
+
+        async with semaphore:
+            attempt = 0
+            while True:
+                try:
+                    await run(change)
+                except Exception as e:
+                    delay = retry_delay(e, attempt) if retry_delay and attempt < retries else None
+                    if delay is None:
+                        result.failed.append((change, e))
+                        return
+
+                    attempt += 1
+                    result.retries += 1
+                    await asyncio.sleep(delay)
+                else:
+                    result.applied.append(change)
+                    return
+
+    await asyncio.gather(*(worker(n) for n in changes))
+    result.finished = time.perf_counter()
+    return result
@@ -0,0 +1,50 @@
+class RoleState:
+    """In memory copy of who has the inWar role, both in discord and per the `last_war` table.
+
+    Filled once, then kept up to date by member update events and by our own role changes and
+    `last_war` writes, so comparing the two never needs a database query or a walk of the member list.
+    """
+    def __init__(self):
+        self.holders = None  # user ids with the role in discord
+        self.last_war = None  # user id: [tags] from last_war
+
+    @property
+    def loaded(self):
+        return self.holders is not None and self.last_war is not None
+
+    def load_holders(self, user_ids):
+        self.holders = set(user_ids)
+
+    def load_last_war(self, records):
+        """Replaces the `last_war` copy with (tag, userid) records.
+        """
+        self.last_war = {}
+        self.add_last_war(records)
+
+    def add_last_war(self, records):
+        if self.last_war is None:
+            return  # we'll load it all the next time it's needed
+
+        for tag, user_id in records:
+            self.last_war.setdefault(user_id, []).append(tag)
+
+    def remove_last_war(self, user_ids):
+        if self.last_war is None:
+            return
+
+        for user_id in user_ids:
+            self.last_war.pop(user_id, None)
+
+    def role_added(self, user_id):
+        if self.holders is not None:
+            self.holders.add(user_id)
+
+    def role_removed(self, user_id):
+        if self.holders is not None:
+            self.holders.discard(user_id)
+
+    def diff(self):
+        """Returns (user ids in last_war without the role, user ids with the role not in last_war).
+        """
+        in_db = set(self.last_war)
+        return in_db - self.holders, self.holders - in_db
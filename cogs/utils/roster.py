@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+
+class ClanRoster:
+    __slots__ = ('tag', 'name', 'members', 'fetched')
+
+    def __init__(self, clan):
+        self.tag = clan.tag
+        self.name = clan.name
+        self.members = {n.tag: n for n in clan.members}
+        self.fetched = time.monotonic()
+
+
+class Roster:
+    """The current member lists of the home clans (AW and A4W), kept in memory and shared between cogs.
+
+    A clan's list is fetched again once it's older than `ttl` seconds (``rosterTTL`` in creds.json),
+    and kept up to date in between by the clan member join/leave events.
+    """
+    TTL = 600
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.ttl = int(bot.loaded.get('rosterTTL', self.TTL))
+        self._clans = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def clan_tags(self):
+        return self.bot.AW_CLAN_TAG, self.bot.A4W_CLAN_TAG
+
+    def _is_fresh(self, clan_tag):
+        clan = self._clans.get(clan_tag)
+        return clan is not None and time.monotonic() - clan.fetched < self.ttl
+
+    async def refresh(self, clan_tag=None):
+        """Fetches the member list of one home clan, or all of them if no tag is given.
+        """
+        tags = [clan_tag] if clan_tag else self.clan_tags
+        clans = await asyncio.gather(*(self.bot.coc.get_clan(n) for n in tags))
+        for clan in clans:
+            self._clans[clan.tag] = ClanRoster(clan)
+
+    async def _ensure_fresh(self, clan_tags):
+        stale = [n for n in clan_tags if not self._is_fresh(n)]
+        if not stale:
+            return
+
+        async with self._lock:
+            for clan_tag in stale:
+                if self._is_fresh(clan_tag):
+                    continue  # someone else refreshed it while we were waiting
+                try:
+                    await self.refresh(clan_tag)
+                except Exception:
+                    if clan_tag not in self._clans:
+                        raise
+                    # the API is having a moment; an old member list is better than nothing
+
+    async def members(self, clan_tag):
+        """Returns the members of a home clan.
+        """
+        await self._ensure_fresh([clan_tag])
+        return list(self._clans[clan_tag].members.values())
+
+    async def clan_name(self, clan_tag):
+        await self._ensure_fresh([clan_tag])
+        return self._clans[clan_tag].name
+
+    async def find(self, ign):
+        """Returns the first home clan member with an IGN (case insensitive), searching AW then A4W.
+        """
+        await self._ensure_fresh(self.clan_tags)
+
+        ign = ign.lower()
+        for clan_tag in self.clan_tags:
+            for member in self._clans[clan_tag].members.values():
+                if member.name.lower() == ign:
+                    return member
+
+        return None
+
+    def add_member(self, member):
+        clan = self._clans.get(member.clan.tag)
+        if clan is not None:
+            clan.members[member.tag] = member
+
+    def remove_member(self, member):
+        for clan in self._clans.values():
+            clan.members.pop(member.tag, None)
@@ -0,0 +1,140 @@
+import asyncio
+import datetime
+import logging
+
+import pytz
+
+from cogs.utils import db
+
+log = logging.getLogger(__name__)
+
+
+class ScheduledJobs(db.Table, table_name='scheduled_jobs'):
+    name = db.Column(db.String(), primary_key=True)
+    last_run = db.Column(db.Datetime(timezone=True))
+
+
+def daily(hour, *, weekday=None):
+    """Fires at `hour`:00 every day, or only on `weekday` (0 is monday) if given.
+    """
+    def next_after(after, tz):
+        day = after.date()
+        while True:
+            candidate = tz.localize(datetime.datetime.combine(day, datetime.time(hour)))
+            if candidate > after and (weekday is None or day.weekday() == weekday):
+                return candidate
+            day += datetime.timedelta(days=1)
+
+    return next_after
+
+
+def last_weekday_of_month(weekday, hour):
+    """Fires at `hour`:00 on the last `weekday` (0 is monday) of every month.
+    """
+    def next_after(after, tz):
+        day = after.date()
+        while True:
+            candidate = tz.localize(datetime.datetime.combine(day, datetime.time(hour)))
+            last_of_kind = (day + datetime.timedelta(days=7)).month != day.month
+            if candidate > after and day.weekday() == weekday and last_of_kind:
+                return candidate
+            day += datetime.timedelta(days=1)
+
+    return next_after
+
+
+class Job:
+    __slots__ = ('name', 'next_after', 'callback', 'last_run', 'next_run')
+
+    def __init__(self, name, next_after, callback):
+        self.name = name
+        self.next_after = next_after
+        self.callback = callback
+        self.last_run = None
+        self.next_run = None
+
+
+class Scheduler:
+    """Runs coroutines at wall clock times in a given timezone.
+
+    Each job sleeps until exactly its next fire time rather than polling. The last run of every job is
+    stored in the `scheduled_jobs` table, so a restart neither repeats a run nor skips one that was missed
+    while the bot was down (a missed run fires once, as soon as the bot is back).
+    """
+    RETRY_DELAY = 60  # seconds to wait before trying the `scheduled_jobs` table again
+
+    def __init__(self, bot, *, timezone='Australia/Sydney'):
+        self.bot = bot
+        self.tz = pytz.timezone(timezone)
+        self.jobs = {}
+        self._tasks = []
+
+    def add_job(self, name, next_after, callback):
+        self.jobs[name] = Job(name, next_after, callback)
+
+    def start(self):
+        self._tasks = [self.bot.loop.create_task(self._run(job)) for job in self.jobs.values()]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def now(self):
+        return datetime.datetime.now(self.tz)
+
+    async def _load_last_run(self, job):
+        query = "SELECT last_run FROM scheduled_jobs WHERE name = $1"
+        dump = await self.bot.pool.fetchrow(query, job.name)
+        if dump and dump['last_run']:
+            job.last_run = dump['last_run'].astimezone(self.tz)
+
+    async def _save_last_run(self, job):
+        query = """INSERT INTO scheduled_jobs (name, last_run) VALUES ($1, $2)
+                   ON CONFLICT (name) DO UPDATE SET last_run = EXCLUDED.last_run
+                """
+        await self.bot.pool.execute(query, job.name, job.last_run)
+
+    async def _run(self, job):
+        try:
+            await self.bot.wait_until_ready()
+
+            while not self.bot.is_closed():
+                try:
+                    await self._load_last_run(job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    # without the last run we can't tell whether one was missed, so keep trying
+                    log.exception('Failed to load last run of scheduled job %s', job.name)
+                    await asyncio.sleep(self.RETRY_DELAY)
+                else:
+                    break
+
+            while not self.bot.is_closed():
+                job.next_run = job.next_after(job.last_run or self.now(), self.tz)
+
+                delay = (job.next_run - self.now()).total_seconds()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                try:
+                    await job.callback()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    # don't persist a failed run; if we restart before the next one it will be retried
+                    log.exception('Scheduled job %s failed', job.name)
+                    job.last_run = self.now()
+                    continue
+
+                job.last_run = self.now()
+                try:
+                    await self._save_last_run(job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    # we still know about this run, it just won't survive a restart
+                    log.exception('Failed to save last run of scheduled job %s', job.name)
+
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,47 @@
+import asyncio
+
+
+class SeasonContext:
+    """The active season row, as used when working out donations for a sweep.
+    """
+    __slots__ = ('donations_by_today', 'start_date')
+
+    def __init__(self, record):
+        self.donations_by_today = record['donationsbytoday']
+        self.start_date = record['start_date']
+
+    def __repr__(self):
+        return f'<SeasonContext donations_by_today={self.donations_by_today} start_date={self.start_date}>'
+
+
+class SeasonCache:
+    """Holds the active season in memory so we only go to the database after it has been changed.
+
+    Anything that writes to the `season` table should call :meth:`invalidate` afterwards.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self._season = None
+        self._lock = asyncio.Lock()
+
+    async def get(self):
+        if self._season is not None:
+            return self._season
+
+        async with self._lock:
+            if self._season is None:
+                query = "SELECT donationsbytoday, start_date FROM season WHERE toggle = $1"
+                dump = await self.bot.pool.fetchrow(query, True)
+                if dump is None:
+                    return None  # no active season; don't cache that so a new season gets picked up
+
+                self._season = SeasonContext(dump)
+
+        return self._season
+
+    async def donations_by_today(self):
+        season = await self.get()
+        return season.donations_by_today
+
+    def invalidate(self):
+        self._season = None
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+
+class SweepStats:
+    """Keeps track of timings and failures for a single sweep of player fetches.
+    """
+    def __init__(self):
+        self.latencies = []
+        self.failed = []  # keys that couldn't be fetched or used
+        self.skipped = 0  # accounts that didn't need fetching at all
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, latency, failed=None):
+        self.latencies.append(latency)
+        if failed is not None:
+            self.failed.append(failed)
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        return self
+
+    @property
+    def failures(self):
+        return len(self.failed)
+
+    @property
+    def total(self):
+        return len(self.latencies)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.total / elapsed if elapsed else 0.0
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return 0.0
+
+        ordered = sorted(self.latencies)
+        # nearest-rank percentile, good enough for a few hundred samples
+        index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+        return ordered[index]
+
+    def __str__(self):
+        return (f'{self.total} accounts in {self.elapsed:.1f}s ({self.rate:.2f}/sec), '
+                f'p50 {self.percentile(50) * 1000:.0f}ms, p95 {self.percentile(95) * 1000:.0f}ms, '
+                f'{self.failures} failures, {self.skipped} skipped')
+
+
+async def fetch_many(keys, fetch, *, limit, errors=(Exception, ), stats=None):
+    """Runs ``fetch(key)`` for every key with at most ``limit`` calls in flight,
+    yielding ``(key, result)`` pairs in the order they complete.
+
+    If a fetch raises one of ``errors`` the result is ``None`` and it is counted as a failure.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    stats = stats or SweepStats()
+
+    async def run(key):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await fetch(key)
+            except errors:
+                stats.record(time.perf_counter() - start, failed=key)
+                return key, None
+
+            stats.record(time.perf_counter() - start)
+            return key, result
+
+    tasks = [asyncio.ensure_future(run(key)) for key in keys]
+
+    try:
+        for future in asyncio.as_completed(tasks):
+            yield await future
+    finally:
+        # if the consumer bailed out early don't leave fetches running in the background
+        for task in tasks:
+            task.cancel()
+
+
+def split_by_clan(rows, members, last_seen):
+    """Works out which claimed accounts actually need a full player fetch.
+
+    ``members`` maps tag -> (clan name, donations) from the home clan member lists, and
+    ``last_seen`` maps tag -> donations as of the last sweep. Accounts in a home clan whose
+    donations haven't moved can't have a new `Friend in Need` count, so only their clan is resolved.
+
+    Returns a tuple of (rows to fetch, {tag: clan name} of resolved accounts).
+    """
+    to_fetch = []
+    resolved = {}
+
+    for row in rows:
+        tag = row['tag']
+        try:
+            clan, donations = members[tag]
+        except KeyError:
+            to_fetch.append(row)  # not in a home clan, we need the player to know where they are
+            continue
+
+        if last_seen.get(tag) == donations:
+            resolved[tag] = clan
+        else:
+            to_fetch.append(row)
+
+    return to_fetch, resolved
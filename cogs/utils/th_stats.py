@@ -0,0 +1,64 @@
+def split_rate(rate):
+    """'2/3' -> (2, 3), as hit and defense rates were stored before war_stats had numeric columns.
+    """
+    done, _, total = (rate or '').partition('/')
+    return int(done or 0), int(total or 0)
+
+
+class PlayerStats:
+    """A player's added up war stats at one town hall level.
+    """
+    __slots__ = ('th', 'tag', 'name', 'hits', 'attacks', 'defended', 'defenses')
+
+    def __init__(self, th, tag, name, hits=0, attacks=0, defended=0, defenses=0):
+        self.th = th
+        self.tag = tag
+        self.name = name
+        self.hits = hits
+        self.attacks = attacks
+        self.defended = defended
+        self.defenses = defenses
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record['th'], record['tag'], record['name'],
+                   record['hits'], record['attacks'], record['defended'], record['defenses'])
+
+
+def aggregate(rows):
+    """Adds up `war_stats` rows in a single pass, returning {th: [PlayerStats]}.
+
+    Rows need th, tag, name and war_no, plus either the numeric columns or the old
+    hitrate/defenserate strings. Each player keeps the name from their most recent war.
+    """
+    players = {}
+    latest = {}
+
+    for row in rows:
+        key = (row['th'], row['tag'])
+        player = players.get(key)
+
+        if player is None:
+            player = players[key] = PlayerStats(row['th'], row['tag'], row['name'])
+            latest[key] = row['war_no']
+        elif row['war_no'] < latest[key]:
+            player.name = row['name']
+            latest[key] = row['war_no']
+
+        hitrate = row.get('hitrate')
+        if hitrate is not None:
+            hits, attacks = split_rate(hitrate)
+            defended, defenses = split_rate(row.get('defenserate'))
+        else:
+            hits, attacks, defended, defenses = row['hits'], row['attacks'], row['defended'], row['defenses']
+
+        player.hits += hits or 0
+        player.attacks += attacks or 0
+        player.defended += defended or 0
+        player.defenses += defenses or 0
+
+    by_th = {}
+    for player in players.values():
+        by_th.setdefault(player.th, []).append(player)
+
+    return by_th
@@ -0,0 +1,76 @@
+class IndexedMember:
+    __slots__ = ('tag', 'name', 'town_hall', 'map_position', 'is_opponent')
+
+    def __init__(self, member, flipped=False):
+        self.tag = member.tag
+        self.name = member.name
+        self.town_hall = member.town_hall
+        self.map_position = member.map_position
+        self.is_opponent = member.is_opponent != flipped
+
+    def __str__(self):
+        return self.name
+
+
+class WarIndex:
+    """Lookups for a single war, built once when the war is fetched.
+
+    Finding a member (or the attacks on a base) by tag is then a dict lookup,
+    rather than a scan of the whole war roster for every attack.
+
+    League wars can list our clan as the opponent, so pass `clan_tag` to have
+    the sides (and every member's `is_opponent`) from that clan's point of view.
+    """
+    def __init__(self, war, clan_tag=None):
+        flipped = clan_tag is not None and war.opponent.tag == clan_tag
+        ours, theirs = (war.opponent, war.clan) if flipped else (war.clan, war.opponent)
+
+        self.clan_tag = ours.tag
+        self.opponent_tag = theirs.tag
+        self.end_time = war.end_time.time if war.end_time else None  # naive UTC
+        self.members = {}
+        self.attacks = []  # (attacker, attack) for every attack in the war
+        self.attacks_on = {}  # defender tag: [attacks on that base]
+
+        for member in war.members:
+            indexed = self.members[member.tag] = IndexedMember(member, flipped)
+            for attack in member.attacks or []:
+                self.attacks.append((indexed, attack))
+                self.attacks_on.setdefault(attack.defender_tag, []).append(attack)
+
+    def __contains__(self, tag):
+        return tag in self.members
+
+    def __getitem__(self, tag):
+        return self.members[tag]
+
+    def get(self, tag):
+        return self.members.get(tag)
+
+    def town_hall(self, tag):
+        member = self.members.get(tag)
+        return member.town_hall if member else None
+
+    @property
+    def ours(self):
+        return [n for n in self.members.values() if not n.is_opponent]
+
+    @property
+    def theirs(self):
+        return [n for n in self.members.values() if n.is_opponent]
+
+    def defenses(self, defender_tag):
+        """Returns (defended, total) same-TH attacks on a base, where defended means it wasn't 3 starred.
+        """
+        defender_th = self.town_hall(defender_tag)
+        defended = total = 0
+
+        for attack in self.attacks_on.get(defender_tag, []):
+            if self.town_hall(attack.attacker_tag) != defender_th:
+                continue
+
+            total += 1
+            if attack.stars != 3:
+                defended += 1
+
+        return defended, total
@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands
 
-from cogs.utils import checks, db
+from cogs.utils import checks, db, war_index, reconcile, role_state
 
 
 def list_to_sql_tuple(list_of_things):
@@ -30,6 +30,33 @@ class WarAdmin(commands.Cog):
         self.AW_SERVER_ID = 352298238180851712
         self.NERD_BOT_ZONE_ID = 527373033568993282
         self.CLAN_TAG = '#P0LYJC8C'
+        self.role_state = role_state.RoleState()  # who has the inWar role, in discord and in last_war
+
+    async def ensure_role_state(self, connection, guild):
+        if self.role_state.holders is None:
+            self.role_state.load_holders(n.id for n in guild.get_role(self.bot.IN_WAR_ROLE_ID).members)
+
+        if self.role_state.last_war is None:
+            dump = await connection.fetch("SELECT tag, userid FROM last_war")
+            self.role_state.load_last_war((n['tag'], n['userid']) for n in dump)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if after.guild.id != self.AW_SERVER_ID:
+            return
+
+        had_role = any(n.id == self.bot.IN_WAR_ROLE_ID for n in before.roles)
+        has_role = any(n.id == self.bot.IN_WAR_ROLE_ID for n in after.roles)
+
+        if has_role and not had_role:
+            self.role_state.role_added(after.id)
+        elif had_role and not has_role:
+            self.role_state.role_removed(after.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        if member.guild.id == self.AW_SERVER_ID:
+            self.role_state.role_removed(member.id)  # their roles go with them
 
     @commands.Cog.listener()
     async def cog_command_error(self, ctx, error):
@@ -104,6 +131,7 @@ class WarAdmin(commands.Cog):
         query = f"INSERT INTO last_war (tag, userid) VALUES {fmt};"
 
         await ctx.db.execute(query)
+        self.role_state.add_last_war(('Unknown', userid) for userid in mention_ids)
 
         errors = []
 
@@ -113,6 +141,8 @@ class WarAdmin(commands.Cog):
                                                f'`{ctx.prefix}warrole add [mentions]`')
             except (discord.Forbidden, discord.HTTPException):
                 errors.append(n)
+            else:
+                self.role_state.role_added(n.id)
 
         if not errors:
             return await ctx.tick()
@@ -143,6 +173,7 @@ class WarAdmin(commands.Cog):
 
         query = f"DELETE FROM last_war WHERE userid in {member_tuple};"
         await ctx.db.execute(query)
+        self.role_state.remove_last_war(n.id for n in mentions)
 
         role = ctx.guild.get_role(self.bot.IN_WAR_ROLE_ID)  # get role object
 
@@ -154,6 +185,8 @@ class WarAdmin(commands.Cog):
                                                  f'{ctx.command.qualified_name}')
             except (discord.Forbidden, discord.HTTPException):  # possible (discord) errors
                 errors.append(member)
+            else:
+                self.role_state.role_removed(member.id)
 
         if not errors:
             return await ctx.tick()
@@ -173,6 +206,7 @@ class WarAdmin(commands.Cog):
         for n in role.members:
             await n.remove_roles(role, reason=f'{str(ctx.author)} - '
                                               f'{ctx.command.qualified_name}')
+            self.role_state.role_removed(n.id)
         await ctx.tick()
 
     @war_role.command()
@@ -183,11 +217,10 @@ class WarAdmin(commands.Cog):
 
         Requires `manage_roles` permission
         """
-        query = "SELECT userid, tag FROM last_war"
-        dump = await ctx.db.fetch(query)
+        await self.ensure_role_state(ctx.db, ctx.guild)
 
-        with_db_role = [f'<@{n[0]}> - {n[1]}' for n in dump]
-        with_discord_role = [n.id for n in ctx.guild.get_role(self.bot.IN_WAR_ROLE_ID).members]
+        with_db_role = [f'<@{userid}> - {tag}' for userid, tags in self.role_state.last_war.items() for tag in tags]
+        with_discord_role = list(self.role_state.holders)
 
         # sort list by user ids (a big int) ascending, so that both are sorted same way,
         # meaning easy to pick inconsistencies between them (shouldnt be to start with)
@@ -207,58 +240,74 @@ class WarAdmin(commands.Cog):
                     value='\n'.join(f'<@{userid}>' for userid in with_discord_role) or 'No Members',
                     inline=True)
 
+        missing, extra = self.role_state.diff()
+        if missing or extra:
+            e.colour = discord.Colour.red()
+            e.add_field(name="Out of sync",
+                        value='\n'.join([f'<@{userid}> - missing role' for userid in sorted(missing)]
+                                         + [f'<@{userid}> - not in DB' for userid in sorted(extra)]),
+                        inline=False)
+
         await ctx.send(embed=e)
 
+    ROLE_CONCURRENCY = 5  # role changes in flight at once
+    ROLE_RETRIES = 3
+
+    @staticmethod
+    def role_retry_delay(error, attempt):
+        """How long to wait before retrying a failed role change, or None if it shouldn't be retried.
+        """
+        if not isinstance(error, discord.HTTPException) or error.status not in (429, 500, 502, 503, 504):
+            return None  # eg. Forbidden, retrying won't help
+
+        # discord.py already waits out the route's bucket, so this is only hit once it's given up on us
+        try:
+            return float(error.response.headers['Retry-After'])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return 2 ** attempt
+
     async def give_roles(self, db, guild, author):
         ids_to_remove, ids_to_give, not_in_db = await self.get_ids(db)
 
-        failed_members_to_give = []
-
         role = guild.get_role(self.bot.IN_WAR_ROLE_ID)  # get role object
+        await self.ensure_role_state(db, guild)
 
-        for user_id in ids_to_remove:
-            member = guild.get_member(int(user_id))  # get member object
-
-            if not member:
-                continue
+        # who should have the role once we're done, compared with who actually has it
+        holders = set(self.role_state.holders)
+        desired = (holders - set(ids_to_remove)) | set(ids_to_give)
+        changes = reconcile.plan(desired, holders, guild.get_member)
 
-            try:
-                await member.remove_roles(role,
-                                          reason=f"inWar Role Removal (mass): "  # reason for audit log
-                                                 f"{str(author)} ({author.id})"
-                                          )
-            except (discord.Forbidden, discord.HTTPException):  # possible (discord) errors
-                continue  # dont care if it failed
+        async def run(change):
+            if change.add:
+                await change.member.add_roles(role, reason=f"inWar Role Given (mass): "  # reason for audit log
+                                                           f"{str(author)} ({author.id})")
+            else:
+                await change.member.remove_roles(role, reason=f"inWar Role Removal (mass): "
+                                                              f"{str(author)} ({author.id})")
 
-        for user_id in ids_to_give:
-            member = guild.get_member(int(user_id))  # get member object
+        result = await reconcile.apply(changes, run, limit=self.ROLE_CONCURRENCY, retries=self.ROLE_RETRIES,
+                                       retry_delay=self.role_retry_delay)
 
-            if not member:
-                failed_members_to_give.append(user_id)
-                continue
+        for change in result.applied:
+            if change.add:
+                self.role_state.role_added(change.user_id)
+            else:
+                self.role_state.role_removed(change.user_id)
 
-            try:
-                await member.add_roles(role,
-                                       reason=f"inWar Role Given (mass): "  # reason for audit log
-                                              f"{str(author)} ({author.id})"
-                                       )
-            except (discord.Forbidden, discord.HTTPException):  # possible (discord) errors
-                failed_members_to_give.append(member)  # for later we will let them know who failed
+        failed_members_to_give = [change.member or change.user_id for change, _ in result.failed if change.add]
+        failed_members_to_remove = [change.member for change, _ in result.failed
+                                    if not change.add and change.member]
 
-        if failed_members_to_give or not_in_db:
+        if failed_members_to_give or failed_members_to_remove or not_in_db:
 
             # format the problem people into a string with 1 person per line
             not_in_db = '\n'.join(f'{ign} ({tag})'
                                   for (index, (ign, tag)) in enumerate(not_in_db)) or None
-            role_add = '\n'.join(f'{user.mention}' for user in
-                                 failed_members_to_give if isinstance(user, discord.Member)) or None
-
-            if role_add:
-                role_add = role_add.join(f'UserID {user_id} - NIS' for user_id in
-                                         failed_members_to_give if not isinstance(user_id, discord.Member))
-            else:
-                role_add = '\n'.join(f'UserID {user_id} - NIS' for user_id in
-                                     failed_members_to_give if not isinstance(user_id, discord.Member)) or None
+            role_add = '\n'.join([f'{user.mention}' for user in
+                                  failed_members_to_give if isinstance(user, discord.Member)] +
+                                 [f'UserID {user_id} - NIS' for user_id in
+                                  failed_members_to_give if not isinstance(user_id, discord.Member)]) or None
+            role_remove = '\n'.join(user.mention for user in failed_members_to_remove) or None
 
             e = discord.Embed(colour=discord.Colour.red())  # we're going to send an error embed --> red colour
             e.set_author(name="Errors when dealing with the following")
@@ -269,84 +318,60 @@ class WarAdmin(commands.Cog):
             if role_add:
                 e.add_field(name="Failed to give role:", value=role_add)  # same
 
-            e.set_footer(text="Please check bot logs for traceback (if applicable)")  # tell them to check bot log
+            if role_remove:
+                e.add_field(name="Failed to remove role:", value=role_remove)
+
+            e.set_footer(text=f"{result}. "
+                              f"Please check bot logs for traceback (if applicable)")  # tell them to check bot log
 
             return e
 
         return None
 
-    async def get_ids(self, db):
-        '''Takes in the client and connection as argument, returns 1 tuple of 2 lists (remove,add)'''
-
-        # Create a cursor & define AW tag
+    async def get_ids(self, connection):
+        '''Takes in a connection as argument, returns a tuple of (ids to remove, ids to add, unclaimed (ign, tag)s)'''
 
         # Query to get details for current war
         currentWar = await self.bot.coc.get_current_war(self.CLAN_TAG)
+        index = war_index.WarIndex(currentWar)
         # Get the list of tags
-        currentTags = [x.tag for x in currentWar.members if not x.is_opponent]
-
-        # Get a list of tags from last war
-        sql = 'select tag from last_war'
-        dump = await db.fetch(sql)
-        lastTags = [x[0] for x in dump]
-
-        # Little bit memory waste T_T
-        # Create sets from lists (so finding difference is easy)
-        current = set(currentTags)
-        last = set(lastTags)
-
-        # people who were in last war but are not in current war
-        remove = list_to_sql_tuple(list(last - current))
-
-        # people who are in current war but weren't in last
-        add = list_to_sql_tuple(list(current - last))
-
-        # now that we have tags, we just need to query table tag_to_id to get corresponding Ids
-
-        # To remove
-        if remove:
-            sql = f'SELECT userid FROM claims WHERE tag IN {remove};'
-            dump = await db.fetch(sql)
-            idsToRemove = [x[0] for x in dump]
-        else:
-            idsToRemove = []
-        # To add
-
-        if add:
-            sql = f'SELECT userid from claims where tag in {add};'
-            dump = await db.fetch(sql)
-            idsToAdd = [x[0] for x in dump]
-
-        else:
-            idsToAdd = []
-
-        # We find list of tags which are not present in our database, i.e unclaimed
-        sql = 'SELECT tag FROM claims'
-        dump = await db.fetch(sql)
-        tagsInDb = [x[0] for x in dump]
-
-        tagsInDb = set(tagsInDb)
-        unclaimedTags = list(current - tagsInDb)
-
-        # Get ign of people with unclaimed tags
-        unclaimed = [(str(x), tag) for x in currentWar.members for tag in unclaimedTags if x.tag == tag]
-
-        # If there are any unclaimed accounts (We don't want to truncate the last war data)
-        if unclaimed:
-            pass
-        else:
-            # Update the table 'last_war' to hold new data
-            # first delete the current values in table
-            await db.execute('TRUNCATE last_war')
-
-            # Now insert the values
-            query = f"SELECT tag, userid FROM claims WHERE tag in {list_to_sql_tuple(currentTags)}"
-            dump = await db.fetch(query)
-
-            fmt = ', '.join(f"('{tag}', {userid})"
-                            for (index, (tag, userid)) in enumerate(dump))
-            query = f"INSERT INTO last_war (tag, userid) VALUES {fmt}"
-            await db.execute(query)
+        currentTags = [x.tag for x in index.ours]
+
+        # one round trip for the lot: people who were in last war but aren't in this one, people who are in this
+        # one but weren't in last, tags in this war nobody has claimed, and who has claimed the rest
+        query = """SELECT 'remove' AS kind, claims.userid, claims.tag
+                   FROM last_war
+                   INNER JOIN claims ON claims.tag = last_war.tag
+                   WHERE last_war.tag <> ALL($1::text[])
+                   UNION ALL
+                   SELECT CASE WHEN last_war.tag IS NULL THEN 'add' ELSE 'stay' END, claims.userid, claims.tag
+                   FROM claims
+                   LEFT JOIN (SELECT DISTINCT tag FROM last_war) AS last_war ON last_war.tag = claims.tag
+                   WHERE claims.tag = ANY($1::text[])
+                   UNION ALL
+                   SELECT 'unclaimed', NULL, current.tag
+                   FROM unnest($1::text[]) AS current(tag)
+                   WHERE NOT EXISTS (SELECT 1 FROM claims WHERE claims.tag = current.tag)
+                """
+
+        async with connection.transaction():
+            dump = await connection.fetch(query, currentTags)
+
+            idsToRemove = [n['userid'] for n in dump if n['kind'] == 'remove']
+            idsToAdd = [n['userid'] for n in dump if n['kind'] == 'add']
+
+            # Get ign of people with unclaimed tags
+            unclaimed = [(index[n['tag']].name, n['tag']) for n in dump if n['kind'] == 'unclaimed']
+
+            # If there are any unclaimed accounts we don't want to truncate the last war data
+            if not unclaimed:
+                # Update the table 'last_war' to hold everyone claimed in this war
+                last_war = [(n['tag'], n['userid']) for n in dump if n['kind'] in ('add', 'stay')]
+                await connection.execute('TRUNCATE last_war')
+                await connection.copy_records_to_table('last_war', columns=('tag', 'userid'), records=last_war)
+
+        if not unclaimed:
+            self.role_state.load_last_war(last_war)
 
         # If nothing goes wrong return lists
         return idsToRemove, idsToAdd, unclaimed
@@ -354,7 +379,8 @@ class WarAdmin(commands.Cog):
     async def give_roles_auto(self):
         guild = self.bot.get_guild(self.AW_SERVER_ID)
         author = guild.get_member(self.bot.user.id)
-        e = await self.give_roles(self.bot.pool, guild, author)
+        async with self.bot.pool.acquire() as con:
+            e = await self.give_roles(con, guild, author)
         if e:
             await self.bot.get_channel(self.NERD_BOT_ZONE_ID).send(embed=e)
 
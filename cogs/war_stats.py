@@ -1,8 +1,9 @@
 from discord.ext import commands
-from cogs.utils import checks, paginator, db
+from cogs.utils import checks, paginator, db, war_index, th_stats, sweep, buffer
 from cogs.admin import TabularData
 
 import asyncio
+import logging
 import discord
 import re
 import pygsheets
@@ -10,15 +11,55 @@ import dateutil
 import datetime
 import coc
 
+log = logging.getLogger(__name__)
+
+
+class WarsTable(db.Table, table_name='wars'):
+    id = db.PrimaryKeyColumn()
+
+    opponent_tag = db.Column(db.String())
+    end_time = db.Column(db.Datetime(), index=True)  # UTC
+
+    @classmethod
+    def create_table(cls, *, exists_ok=True):
+        statement = super().create_table(exists_ok=exists_ok)
+        # a war is only finalised once; final_war_stats relies on this to be safe to retry
+        sql = "CREATE UNIQUE INDEX IF NOT EXISTS wars_uniq_idx ON wars (opponent_tag, end_time);"
+        return statement + '\n' + sql
+
 
 class WarStatsTable(db.Table, table_name='war_stats'):
-    war_no = db.Column(db.Integer(), index=True)
+    war_id = db.Column(db.ForeignKey('wars', 'id'), index=True)
 
     name = db.Column(db.String())
     tag = db.Column(db.String())
     th = db.Column(db.Integer(), index=True)
-    hitrate = db.Column(db.String())
-    defenserate = db.Column(db.String())
+    hits = db.Column(db.Integer(), default=0)
+    attacks = db.Column(db.Integer(), default=0)
+    defended = db.Column(db.Integer(), default=0)
+    defenses = db.Column(db.Integer(), default=0)
+
+    # fills the numbers in from the old 'hitrate' and 'defenserate' strings ('2/3') when migrating
+    __backfill__ = {
+        'hits': "COALESCE(NULLIF(split_part(hitrate, '/', 1), '')::integer, 0)",
+        'attacks': "COALESCE(NULLIF(split_part(hitrate, '/', 2), '')::integer, 0)",
+        'defended': "COALESCE(NULLIF(split_part(defenserate, '/', 1), '')::integer, 0)",
+        'defenses': "COALESCE(NULLIF(split_part(defenserate, '/', 2), '')::integer, 0)",
+        'war_id': "(SELECT id FROM wars WHERE opponent_tag = 'legacy-' || war_stats.war_no)",
+    }
+
+    # wars from before the `wars` table have no opponent or end time, so give each old war_no a placeholder
+    # war, a day apart, which keeps them in the same order
+    __backfill_setup__ = {
+        'war_id': """INSERT INTO wars (opponent_tag, end_time)
+                     SELECT 'legacy-' || war_no, timezone('utc', now()) - war_no * interval '1 day'
+                     FROM (SELECT DISTINCT war_no FROM war_stats) AS legacy;""",
+    }
+
+
+class LeagueWarsTable(db.Table, table_name='league_wars'):
+    war_tag = db.Column(db.String(), primary_key=True)  # every finished CWL war we've looked at, ours or not
+    season = db.Column(db.String())
 
 
 class TempStatsTable(db.Table, table_name='temp_stats'):
@@ -35,16 +76,41 @@ class TempStatsTable(db.Table, table_name='temp_stats'):
     percent = db.Column(db.Numeric())
     our_hit = db.Column(db.Boolean(), index=True)
 
+    @classmethod
+    def create_table(cls, *, exists_ok=True):
+        statement = super().create_table(exists_ok=exists_ok)
+        # an attack is only ever stored once per war, however often we poll
+        sql = "CREATE UNIQUE INDEX IF NOT EXISTS temp_stats_uniq_idx ON temp_stats (enemy_clan_tag, attack_number);"
+        return statement + '\n' + sql
+
 
 class WarStats(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.war_index = None  # index of the last war we fetched, see get_war_index
+        self.page_cache = {}  # (th, wars, roster hash): rendered warstats page
+        self.page_cache_roster = None
+        # attacks from the on_war_attack event, written to temp_stats in batches
+        self.attack_writer = buffer.BufferedWriter(bot.loop, self.write_attacks,
+                                                   max_size=self.ATTACK_BATCH_SIZE, interval=self.ATTACK_FLUSH_INTERVAL)
+        self.caught_up = False  # whether we've stored the attacks made before we started listening
         self.stats_updater_task = bot.loop.create_task(self.war_stats_auto_updater())
         self.role_adder_task = bot.loop.create_task(self.war_role_adding_task())
+        self.league_task = bot.loop.create_task(self.league_stats_task())
 
     LEAGUE_BOT_CHANNEL = 528822099360612352
     NERD_BOT_ZONE_CHANNEL = 527373033568993282
     CLAN_TAG = '#P0LYJC8C'
+    ALL_THS = [9, 10, 11, 12]
+    LEAGUE_CONCURRENCY = 7  # round wars fetched at once
+    LEAGUE_INTERVAL = 3600  # seconds between checks for finished league wars
+    ATTACK_BATCH_SIZE = 50
+    ATTACK_FLUSH_INTERVAL = 5  # seconds
+    WARSTATS_WARS = 20  # default number of wars warstats shows, and kept (`warStatsKept` in creds.json)
+
+    @property
+    def wars_kept(self):
+        return int(self.bot.loaded.get('warStatsKept', self.WARSTATS_WARS))
 
     async def cog_command_error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
@@ -59,6 +125,8 @@ class WarStats(commands.Cog):
     def cog_unload(self):
         self.stats_updater_task.cancel()
         self.role_adder_task.cancel()
+        self.league_task.cancel()
+        self.attack_writer.close()
 
     @commands.command()
     @checks.manage_server()
@@ -72,6 +140,20 @@ class WarStats(commands.Cog):
         await self.temporory_war_stats()
         await ctx.tick()
 
+    @commands.command()
+    @checks.manage_server()
+    @checks.mod_commands()
+    async def dl_league(self, ctx):
+        """Adds stats for any finished CWL wars to the `war_stats` table
+
+        You must have `manage_server` permissions to run this command.
+        """
+        added = await self.league_war_stats()
+        if added is None:
+            return await ctx.send('We are not in a league group right now.')
+
+        await ctx.send(f'Added stats for {added} league wars.')
+
     @commands.command()
     @checks.manage_server()
     @checks.mod_commands()
@@ -175,14 +257,14 @@ class WarStats(commands.Cog):
     @commands.command()
     @checks.restricted_channel(LEAGUE_BOT_CHANNEL, NERD_BOT_ZONE_CHANNEL)
     async def warstats(self, ctx, th: int = None, owner_only_last_x_wars: int=None):
-        """Gives you war stats for a max. of 20 wars
+        """Gives you war stats for the last 20 wars
 
         Optional: Specify the TH level of which to get stats. Else all THs will be added to a pagination session
-        Optional: [Owner-only] Specify the number of wars for which to get stats (Between 1 and 20)
+        Optional: [Owner-only] Specify the number of wars for which to get stats (Up to the number of wars kept)
         This command can only be used in #league-bot
 
         """
-        all_ths = [9, 10, 11, 12]
+        all_ths = self.ALL_THS
 
         # this is messy, but its saying that owners can specify the number of wars to fetch,
         # if you're not an owner it's 20
@@ -190,9 +272,9 @@ class WarStats(commands.Cog):
 
         if owner_only_last_x_wars and not is_owner:
             await ctx.send('Ahem, only owners may use that filter. I have set it to default `20`')
-            owner_only_last_x_wars = 20
+            owner_only_last_x_wars = self.WARSTATS_WARS
         if not owner_only_last_x_wars:
-            owner_only_last_x_wars = 20
+            owner_only_last_x_wars = self.WARSTATS_WARS
 
         # this is checking that if theres no TH, it uses all; if its not a valid TH it tells you,
         # or otherwise turns your TH into a list so we can iterate 1 item
@@ -203,70 +285,71 @@ class WarStats(commands.Cog):
         else:
             th = [th]
 
-        entries = []
+        entries = await self.warstats_pages(th, owner_only_last_x_wars)
+
+        pages = paginator.MsgPag(ctx, entries=entries, per_page=1)
+        await pages.paginate(start_page=1)
+
+    def render_th_page(self, th, stats):
+        if not stats['overall']:
+            return f'__**No stats found for TH{th}v{th}. Sorry**__\n'  # nothing found in db for some reason
+
         headers = ['Off HR', 'HR %', 'IGN', 'Def', 'Def %', 'Player Tag']
 
-        for n in th:
-            stats = await self.statsForTh(n, owner_only_last_x_wars)
+        table = TabularData()  # lets make a nice table for each TH page
+        table.set_columns(headers)
+        table.add_rows(list(r.values()) for r in stats['overall'])
+        render = table.render()
 
-            if not stats['overall']:
-                entries.append(f'__**No stats found for TH{n}v{n}. Sorry**__\n')
-                continue  # nothing found in db for some reason. go to next TH
+        string = f'__**Stats for TH{th}v{th}**__'
+        return f'{string}```\n{render}\n```'
 
-            table = TabularData()  # lets make a nice table for each TH page
-            table.set_columns(headers)
-            table.add_rows(list(r.values()) for r in stats['overall'])
-            render = table.render()
+    async def warstats_pages(self, ths, wars_to_fetch):
+        """Returns the rendered warstats page for each TH, from the page cache where possible.
 
-            string = f'__**Stats for TH{n}v{n}**__'
-            string = f'{string}```\n{render}\n```'
+        Pages are keyed on (TH, number of wars, hash of the clan roster), so someone joining or leaving
+        gives new pages; `war_stats` itself only changes in final_war_stats, which rebuilds the cache.
+        """
+        tags = await self.clan_tags()
+        roster = hash(frozenset(tags))
 
-            entries.append(string)
+        if roster != self.page_cache_roster:
+            self.page_cache.clear()  # every page for the old roster is out of date
+            self.page_cache_roster = roster
 
-        pages = paginator.MsgPag(ctx, entries=entries, per_page=1)
-        await pages.paginate(start_page=1)
+        missing = [n for n in ths if (n, wars_to_fetch, roster) not in self.page_cache]
+        if missing:
+            all_stats = await self.statsForTh(missing, wars_to_fetch, tags)
+            for n in missing:
+                self.page_cache[(n, wars_to_fetch, roster)] = self.render_th_page(n, all_stats[n])
 
-    # First helper function, This is used to find the TH of a player given his/her clash Tag
-    def getTownHallLevel(self, clashTag, currentWar):
-        # First we search the enemy clan for tag (Assuming it belongs to enemy clan)
-        enemySearch = [x['townhallLevel'] for x in currentWar['opponent']['members'] if x['tag'] == clashTag]
-        # If it exists, we return TH
-        if enemySearch:
-            return enemySearch[0]
-        else:
-            # Else we search and return TH from out clan (i.e the tag belongs to our clan)
-            return [x['townhallLevel'] for x in currentWar['clan']['members'] if x['tag']==clashTag][0]
-
-    # Second helper function, This is used to calculate how many attacks were defended by base
-    def getdefenses(self, defenderTag, currentWar):
-        # Get all the attacks on base (returns [('attackerTag',stars)..] list)
-        attacksOnBase = [(attack['attackerTag'], attack['stars']) for members in currentWar['opponent']['members'] if 'attacks' in members.keys() for
-                         attack in members['attacks'] if attack['defenderTag'] == defenderTag]
-
-        # varibles to store corresponding values
-        defendedAttacks = 0
-        totalAttacks = 0
-
-        for attack in attacksOnBase:
-            # Get the attacker tag for every attack
-            attackerTag = attack[0]
-            # In case the TH of attcker(from enemy clan) and defender(from our clan) are same
-            if self.getTownHallLevel(attackerTag, currentWar) == self.getTownHallLevel(defenderTag, currentWar):
-                # First increase the count of total attacks
-                totalAttacks += 1
-                # check if it wasn't 3'ed
-                if attack[1] != 3:
-                    # Then increase defended attacks
-                    defendedAttacks += 1
-        # Return the values
-        return defendedAttacks, totalAttacks
-
-    #Helper function, converts 'A/B' to percentage
-    def fracToPer(self, fraction):
-        split = fraction.split('/')
-        numerator = int(split[0])
-        denominator = int(split[1])
+        return [self.page_cache[(n, wars_to_fetch, roster)] for n in ths]
+
+    def invalidate_warstats_pages(self):
+        self.page_cache.clear()
+
+    async def rebuild_warstats_pages(self):
+        self.invalidate_warstats_pages()
+        await self.warstats_pages(self.ALL_THS, self.WARSTATS_WARS)
+
+    @staticmethod
+    def rebuild_done(task):
+        if not task.cancelled() and task.exception() is not None:
+            # the pages are just built on demand instead, but we want to know about it
+            log.error('Failed to rebuild warstats pages', exc_info=task.exception())
 
+    async def clan_tags(self):
+        return [x.tag for x in await self.bot.roster.members(self.CLAN_TAG)]
+
+    async def get_war_index(self):
+        """Fetches the current war and builds a :class:`war_index.WarIndex` for it.
+        """
+        current_war = await self.bot.coc.get_current_war(self.CLAN_TAG)
+        self.war_index = war_index.WarIndex(current_war)
+        return self.war_index
+
+    #Helper function, converts A out of B to a percentage
+    def fracToPer(self, numerator, denominator):
         per = f"{numerator * 100 / denominator:.2f}%" if denominator != 0 else '0.00%'
 
         return per
@@ -276,64 +359,171 @@ class WarStats(commands.Cog):
     # (IT WILL NOT DO ANYTHING IF THE WAR HASN'T ENDED), so make sure this is
     # called after the war has ended and before new war search has begun'''
 
-    async def temporory_war_stats(self):
-        attacks_added = 0
+    async def temporory_war_stats(self, index=None):
+        index = index or await self.get_war_index()
+        enemy_clan_tag = index.opponent_tag
 
         query = "SELECT attack_number FROM temp_stats WHERE enemy_clan_tag = $1"
+        dump = await self.bot.pool.fetch(query, enemy_clan_tag)
+        att_orders = {n[0] for n in dump}
 
-        current_war = await self.bot.coc.get_current_war(self.CLAN_TAG)
+        # work out every new attack (ours and theirs) in memory, then write them all at once
+        rows = self.attack_rows(index, skip=att_orders)
+        await self.store_attacks(self.bot.pool, rows)
+
+        return len(rows)
+
+    def attack_rows(self, index, skip=()):
+        """Returns a `temp_stats` row for every attack in an indexed war, except those with an order in `skip`.
+        """
+        rows = []
+        for member, attack in index.attacks:
+            if attack.order in skip:
+                continue
+
+            rows.append((index.opponent_tag,
+                         attack.order,
+                         attack.defender_tag,
+                         member.tag,
+                         member.name,
+                         member.town_hall,
+                         index.town_hall(attack.defender_tag),
+                         attack.stars,
+                         attack.destruction,
+                         not member.is_opponent))
+
+        return rows
+
+    def add_attack(self, attack, war):
+        """Queues an attack from the on_war_attack event to be stored in `temp_stats`.
+        The home clans' wars are subscribed to in :meth:`AWBot.start_coc_updates`.
+        """
+        if war.clan.tag != self.CLAN_TAG:
+            return  # we only keep stats for AW
+
+        self.attack_writer.add((war.start_time.time, war.opponent.tag,
+                                attack.order,
+                                attack.defender_tag,
+                                attack.attacker_tag,
+                                attack.attacker.name,
+                                attack.attacker.town_hall,
+                                attack.defender.town_hall,
+                                attack.stars,
+                                attack.destruction,
+                                not attack.attacker.is_opponent))
+
+    async def write_attacks(self, items):
+        """Stores buffered (war start time, *temp_stats row) items, dropping any for wars already finalised.
+        """
+        # a war's row in `wars` ends after it started, and before any later war against the same clan starts
+        query = """SELECT DISTINCT x.tag, x.start_time
+                   FROM unnest($1::text[], $2::timestamp[]) AS x(tag, start_time)
+                   INNER JOIN wars ON wars.opponent_tag = x.tag AND wars.end_time >= x.start_time
+                """
+        wars = {(n[1], n[0]) for n in items}
+        dump = await self.bot.pool.fetch(query, [n[0] for n in wars], [n[1] for n in wars])
+        finalised = {(n['tag'], n['start_time']) for n in dump}
+
+        # otherwise a late event would sit in temp_stats forever, as the war has already been cleared out
+        rows = [n[1:] for n in items if (n[1], n[0]) not in finalised]
+        await self.store_attacks(self.bot.pool, rows)
+
+    async def catch_up_attacks(self, index=None):
+        """Stores every attack in the current war we don't already have, and anything still buffered.
+
+        Used when we start (for attacks made while the bot was down) and when the war ends, before finalising.
+        """
+        await self.attack_writer.flush()
+        stored = await self.temporory_war_stats(index)
+        self.caught_up = True
+        return stored
 
-        dump = await self.bot.pool.fetch(query, current_war.opponent.tag)
-        att_orders = [n[0] for n in dump]
+    async def store_attacks(self, con, rows):
+        if not rows:
+            return
 
+        # ON CONFLICT makes a repeated poll (or an overlapping one) a no-op
         query = """INSERT INTO temp_stats 
                     (enemy_clan_tag, attack_number, enemy_tag, attacker_tag,
                      name, th, enemy_th, stars, percent, our_hit)
                     VALUES ($1, $2, $3, $4,
                             $5, $6, $7, $8,
                             $9, $10)
+                    ON CONFLICT DO NOTHING
                 """
+        await con.executemany(query, rows)
 
-        async def add_attacks(our_hit: bool):
-            added = 0
-            if not member.attacks:
-                return None
+    async def league_war_stats(self):
+        """Adds the stats of every finished CWL round war of ours that we haven't already got.
 
-            for attack in member.attacks:
+        Returns the number of wars added, or ``None`` if the clan isn't in a league group.
+        """
+        try:
+            group = await self.bot.coc.get_league_group(self.CLAN_TAG)
+        except coc.NotFound:
+            return None
 
-                if attack.order in att_orders:
-                    continue
+        # '#0' is a round that hasn't been drawn yet
+        war_tags = {tag for war_round in group.rounds for tag in war_round if tag != '#0'}
 
-                enemy_th = self.getTownHallLevel(attack.attacker_tag, current_war)
-
-                await self.bot.pool.execute(query,
-                                            current_war.opponent.tag,
-                                            attack['order'],
-                                            attack['defenderTag'],
-                                            member['tag'],
-                                            member['name'],
-                                            member['townhallLevel'],
-                                            enemy_th,
-                                            attack['stars'],
-                                            attack['destructionPercentage'],
-                                            our_hit)
+        query = "SELECT war_tag FROM league_wars WHERE war_tag = ANY($1::text[])"
+        dump = await self.bot.pool.fetch(query, list(war_tags))
+        to_fetch = war_tags - {n['war_tag'] for n in dump}
+
+        # we can't tell from a war tag whether it's one of ours, so every other war in the group
+        # is fetched (once) too; they all go through the same bounded pool
+        finished = []
+        added = 0
+        async for war_tag, war in sweep.fetch_many(to_fetch, self.bot.coc.get_league_war,
+                                                    limit=self.LEAGUE_CONCURRENCY,
+                                                    errors=(coc.HTTPException, asyncio.TimeoutError)):
+            if war is None or war.state != 'warEnded':
+                continue  # try again next time
+
+            finished.append((war_tag, group.season))
+
+            if self.CLAN_TAG not in (war.clan.tag, war.opponent.tag):
+                continue
+
+            index = war_index.WarIndex(war, clan_tag=self.CLAN_TAG)
+            await self.store_attacks(self.bot.pool, self.attack_rows(index))
+            if await self.final_war_stats(index.opponent_tag, end_time=index.end_time, index=index) is True:
                 added += 1
 
-            return added
+        query = "INSERT INTO league_wars (war_tag, season) VALUES ($1, $2) ON CONFLICT DO NOTHING"
+        await self.bot.pool.executemany(query, finished)
+
+        return added
+
+    async def final_war_stats(self, tag, end_time=None, index=None):
+        """Moves a war's attacks from `temp_stats` into `war_stats`, all in one transaction.
+
+        Returns ``True`` once done, ``False`` if there were no hits or ``None`` if the war had already been
+        finalised (so retrying after a crash or cancellation never writes a war twice).
+        """
+        # prefer names and town halls from the war itself if we've got it indexed
+        if index is None and self.war_index and self.war_index.opponent_tag == tag:
+            index = self.war_index
+        if end_time is None:
+            end_time = index.end_time if index and index.end_time else datetime.datetime.utcnow()
+
+        async with self.bot.pool.acquire() as con:
+            async with con.transaction():
+                finalised = await self._finalise_war(con, tag, end_time, index)
 
-        for member in current_war.clan._members:
-            n = await add_attacks(not member.is_opponent)
-            if n:
-                attacks_added += n
+        if finalised:
+            # the stats have changed, so get the new warstats pages ready before anyone asks for them
+            task = self.bot.loop.create_task(self.rebuild_warstats_pages())
+            task.add_done_callback(self.rebuild_done)
 
-        return attacks_added
+        return finalised
 
-    async def final_war_stats(self, tag):
+    async def _finalise_war(self, con, tag, end_time, index):
         query = "SELECT * FROM temp_stats WHERE enemy_clan_tag = $1 AND our_hit = True"
-        our_hits = await self.bot.pool.fetch(query, tag)
+        our_hits = await con.fetch(query, tag)
 
         query = "SELECT * FROM temp_stats WHERE enemy_clan_tag = $1 AND our_hit = False"
-        opponent_hits = await self.bot.pool.fetch(query, tag)
+        opponent_hits = await con.fetch(query, tag)
 
         if not our_hits:
             return False
@@ -376,8 +566,6 @@ class WarStats(commands.Cog):
                     if attack['stars'] != 3:
                         defended_attacks += 1
 
-            hr = f'{sum(successful_hits)}/{(len(successful_hits))}'
-            war_no = 1
             player_name = member[0]['name']
             if '"' in player_name:
                 player_name.replace("'", "''")
@@ -386,28 +574,40 @@ class WarStats(commands.Cog):
             player_tag = member[0]['attacker_tag']
             player_th = member[0]['th']
 
-            dr = f'{defended_attacks}/{total_attacks_on_base}'
+            indexed = index and index.get(player_tag)
+            if indexed:
+                player_name, player_th = indexed.name, indexed.town_hall
 
-            row = [war_no, player_name, player_tag, player_th, hr, dr]
+            row = [player_name, player_tag, player_th,
+                   sum(successful_hits), len(successful_hits), defended_attacks, total_attacks_on_base]
             sql_rows.append(row)
 
-        query = "UPDATE war_stats SET war_no = war_no +1;"
-        await self.bot.pool.execute(query)
+        # the wars row doubles as the "already finalised" marker
+        query = """INSERT INTO wars (opponent_tag, end_time) VALUES ($1, $2)
+                   ON CONFLICT (opponent_tag, end_time) DO NOTHING
+                   RETURNING id
+                """
+        war_id = await con.fetchval(query, tag, end_time)
 
-        query = "DELETE FROM war_stats WHERE war_no>20;"
-        await self.bot.pool.execute(query)
+        query = "DELETE FROM temp_stats WHERE enemy_clan_tag = $1"
+        await con.execute(query, tag)
 
-        query = f"""INSERT INTO war_stats 
-                    (war_no, name, tag, th,
-                     hitrate, defenserate) VALUES ($1, $2, $3, $4, $5, $6);"""
-        for n in sql_rows:
-            await self.bot.pool.execute(query, n[0], n[1], n[2], n[3], n[4], n[5])
+        if war_id is None:
+            return None  # we've already written this war, so all that was left was cleaning up temp_stats
 
-        query = "DELETE FROM temp_stats WHERE enemy_clan_tag = $1"
-        await self.bot.pool.execute(query, tag)
+        query = """INSERT INTO war_stats (war_id, name, tag, th, hits, attacks, defended, defenses)
+                   SELECT $1, x.name, x.tag, x.th, x.hits, x.attacks, x.defended, x.defenses
+                   FROM unnest($2::text[], $3::text[], $4::integer[],
+                               $5::integer[], $6::integer[], $7::integer[], $8::integer[])
+                   AS x(name, tag, th, hits, attacks, defended, defenses)
+                """
+        await con.execute(query, war_id, *zip(*sql_rows))
 
-        self.bot.loaded['updateStats'] = 'false'
-        await self.bot.save_json()
+        # only keep the newest wars; their war_stats rows go with them (ON DELETE CASCADE)
+        query = """DELETE FROM wars
+                   WHERE end_time <= (SELECT end_time FROM wars ORDER BY end_time DESC OFFSET $1 LIMIT 1)
+                """
+        await con.execute(query, self.wars_kept)
 
         return True
 
@@ -499,64 +699,50 @@ class WarStats(commands.Cog):
     #     self.bot.loaded['updateStats'] = 'false'
     #     await self.bot.save_json()
 
-    async def statsForTh(self, townhallLevel, wars_to_fetch):
-        '''Takes in townhall as arguement and gives the stats for that particular townhall level'''
-
-        # Query to get details for current war
-        currentMembers = (await self.bot.coc.get_clan(self.CLAN_TAG))._members
-        tags = tuple([x.tag for x in currentMembers])
+    async def statsForTh(self, townhallLevels, wars_to_fetch, tags=None):
+        '''Takes in a list of townhalls and gives the stats for each of them, as {townhall: stats}'''
+
+        # Get the tags of everyone currently in the clan
+        if tags is None:
+            tags = await self.clan_tags()
+
+        # Add up every player's hits and defenses in the last x wars for all the townhalls at once.
+        # Needs the `wars` table and war_stats.war_id, ie. `database_setup.py db upgrade war_stats` on older DBs
+        query = """WITH recent AS (
+                       SELECT id, end_time FROM wars ORDER BY end_time DESC LIMIT $3
+                   )
+                   SELECT th, tag, (array_agg(name ORDER BY recent.end_time DESC))[1] AS name,
+                          SUM(hits) AS hits, SUM(attacks) AS attacks,
+                          SUM(defended) AS defended, SUM(defenses) AS defenses
+                   FROM war_stats
+                   INNER JOIN recent ON recent.id = war_stats.war_id
+                   WHERE th = ANY($1::integer[]) AND tag = ANY($2::text[])
+                   GROUP BY th, tag
+                """
+        dump = await self.bot.pool.fetch(query, townhallLevels, tags, wars_to_fetch)
 
-        # Get all the data for the particular townhall
-        result = await self.bot.pool.fetch(f"select name,hitrate,defenserate,tag"
-                                           f" from war_stats where th = '{townhallLevel}'"
-                                           f" and tag in {tags} and war_no <= {wars_to_fetch}")
+        players = {}
+        for row in dump:
+            players.setdefault(row['th'], []).append(th_stats.PlayerStats.from_record(row))
 
-        # Get all distinct name for particular townhall (We will use this to display on discord)
-        dump = await self.bot.pool.fetch(f"select distinct name, tag from war_stats where th = '{townhallLevel}'"
-                                         f" and tag in {tags} and war_no <= {wars_to_fetch}")
+        return {th: self.format_th_stats(players.get(th, [])) for th in townhallLevels}
 
-        # Create a dict of data for easy processing
-        data = [{'name': x[0], 'hitrate': x[1], 'defenserate':x[2], 'tag': x[3]} for x in result]
+    def format_th_stats(self, players):
+        '''Formats a list of th_stats.PlayerStats into the offense, defense and overall dicts warstats shows'''
 
         # two lists that will store respective stats
         offensiveStats = []
         defensiveStats = []
         overall_stats = []
 
-        # iterate over all names
-        for name, tag in dump:
-
-            # Variables to hold values to find out hitrates and defenserates
-            cummulativeHits = 0
-            cummulativeTotalAttacks = 0
-            cummulativeDefended = 0
-            cummulativeTotalDefenses = 0
-
-            # Iterate over all data
-            for x in data:
-                # If the name matches
-                if x['tag'] == tag:
-                    # Offensive stats calculations
-                    temp_hitrate = x['hitrate'].split('/')
-                    cummulativeHits += int(temp_hitrate[0])
-                    cummulativeTotalAttacks += int(temp_hitrate[1])
-
-                    # Defensive stats calculations
-                    temp_defenserate = x['defenserate'].split('/')
-                    cummulativeDefended += int(temp_defenserate[0])
-                    cummulativeTotalDefenses += int(temp_defenserate[1])
+        for player in players:
+            name, tag = player.name, player.tag
 
             # Format all stats
-            hitrate = str(cummulativeHits)+'/'+str(cummulativeTotalAttacks)
-            defenserate = str(cummulativeDefended)+'/'+str(cummulativeTotalDefenses)
-            try:
-                hitratePer = f"{cummulativeHits*100/cummulativeTotalAttacks:.2f}%"
-            except ZeroDivisionError:
-                hitratePer = '0%'
-            try:
-                defenseratePer = f"{cummulativeDefended*100/cummulativeTotalDefenses:.2f}%"
-            except ZeroDivisionError:
-                defenseratePer = '0%'
+            hitrate = f"{player.hits}/{player.attacks}"
+            defenserate = f"{player.defended}/{player.defenses}"
+            hitratePer = self.fracToPer(player.hits, player.attacks)
+            defenseratePer = self.fracToPer(player.defended, player.defenses)
 
             # Create 2 dicts, offense and deffense
             overall = {'hitrate': hitrate, 'hitratePer': hitratePer, 'name': name,
@@ -602,6 +788,9 @@ class WarStats(commands.Cog):
             opponent_tag = current_war.opponent.tag
         except AttributeError:
             opponent_tag = None
+        else:
+            # we've got the war anyway, so index it once here for temp and final stats to use
+            self.war_index = war_index.WarIndex(current_war)
 
         return current_war.state, warning_msg, warnings_sent, current_war.end_time, opponent_tag
 
@@ -624,16 +813,19 @@ class WarStats(commands.Cog):
                     if self.bot.update_stats == 'false':
                         continue
 
+                    await self.catch_up_attacks(self.war_index)
                     n = await self.final_war_stats(enemy_tag)
+                    # None means it was finalised before we restarted, nothing new to report
                     if n is True:
                         await self.bot.get_cog('Admin').task_stats('war_stats', True)
                         await (self.bot.get_channel(self.bot.info_channel_id)).send('war-stats-update done')
-                    else:
+                    elif n is False:
                         await (self.bot.get_channel(self.bot.info_channel_id)).send('tried to finalise stats, '
                                                                                     'but there were no hits!')
                     self.bot.update_stats = 'false'
                     self.bot.loaded['updateStats'] = 'false'
                     await self.bot.save_json()
+                    self.caught_up = False  # ready for the next war
 
                     continue
 
@@ -642,12 +834,11 @@ class WarStats(commands.Cog):
                     self.bot.loaded['updateStats'] = 'true'
                     await self.bot.save_json()
 
-                    if ts < 1800:  # half hour
-                        await self.temporory_war_stats()
+                    # from here on attacks come in through on_war_attack, so there's no need to poll for them
+                    if status == 'inWar' and not self.caught_up:
+                        await self.catch_up_attacks(self.war_index)
                         await self.bot.get_cog('Admin').task_stats('temp_stats', True)
-                        continue
 
-                    await asyncio.sleep(ts - 1801)
                     continue
 
         except asyncio.CancelledError:
@@ -656,6 +847,20 @@ class WarStats(commands.Cog):
             await self.stats_updater_task.cancel()
             self.stats_updater_task = self.bot.loop.create_task(self.war_stats_auto_updater())
 
+    async def league_stats_task(self):
+        try:
+            await self.bot.wait_until_ready()
+            while not self.bot.is_closed():
+                try:
+                    await self.league_war_stats()
+                except (coc.HTTPException, asyncio.TimeoutError):
+                    pass  # the API is having a moment, we'll catch up next time
+
+                await asyncio.sleep(self.LEAGUE_INTERVAL)
+
+        except asyncio.CancelledError:
+            pass
+
     async def war_role_adding_task(self):
         warnings_sent = 0
         warning_msg = None
@@ -800,10 +1005,19 @@ class WarStats(commands.Cog):
         sheet1.update_row(1, cols)
 
         # get all data from database
-        rows = await self.bot.pool.fetch(f"select * from war_stats")
+        query = """SELECT dense_rank() OVER (ORDER BY wars.end_time DESC) AS war_no,
+                          name, tag, th, hits, attacks, defended, defenses
+                   FROM war_stats
+                   INNER JOIN wars ON wars.id = war_stats.war_id
+                   ORDER BY war_no
+                """
+        rows = await self.bot.pool.fetch(query)
 
         # Convert it into a form that is accepted by google sheets
-        excelData = [[x[0], x[1], x[2], x[3], x[4], self.fracToPer(x[4]), x[5], self.fracToPer(x[5])] for x in rows]
+        excelData = [[x['war_no'], x['name'], x['tag'], x['th'],
+                      f"{x['hits']}/{x['attacks']}", self.fracToPer(x['hits'], x['attacks']),
+                      f"{x['defended']}/{x['defenses']}", self.fracToPer(x['defended'], x['defenses'])]
+                     for x in rows]
 
         # Write the data into sheet
         sheet1.update_row(2, excelData)
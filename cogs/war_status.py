@@ -15,17 +15,18 @@ class WarStatus(commands.Cog):
                                 function_dicts={'on_player_name_change': self.on_player_change,
                                                 'on_player_townhall_upgrade': self.on_player_change,
                                                 'on_player_builderhall_upgrade': self.on_player_change,
-                                                'on_player_achievement_update': self.on_player_change,
                                                 'on_player_troop_upgrade': self.on_player_change,
                                                 'on_player_spell_upgrade': self.on_player_change,
                                                 'on_player_hero_upgrade': self.on_player_change})
 
     @commands.command()
     async def start_updates(self, ctx):
-        await self.bot.coc.add_clan_update([self.bot.AW_CLAN_TAG, self.bot.A4W_CLAN_TAG], member_updates=True,
-                                           retry_interval=100)
-        self.bot.coc.add_war_update([self.bot.AW_CLAN_TAG, self.bot.A4W_CLAN_TAG], retry_interval=100)
-        self.bot.coc.start_updates('all')
+        # clan and war updates for the home clans are always on (see AWBot.start_coc_updates),
+        # this adds updates for every player in them
+        for clan_tag in self.bot.roster.clan_tags:
+            members = await self.bot.roster.members(clan_tag)
+            self.bot.coc.add_player_update([n.tag for n in members], retry_interval=self.bot.COC_UPDATE_INTERVAL)
+        self.bot.coc.start_updates('player')
 
         await ctx.tick()
 
@@ -413,9 +414,11 @@ class WarStatus(commands.Cog):
         self.bot.webhook.send(new_war.clan_tag)
 
     async def on_clan_member_join(self, member):
+        self.bot.roster.add_member(member)
         self.bot.webhook.send(f'New member {member.name} joined clan {member.clan.name}.')
 
     async def on_clan_member_leave(self, member):
+        self.bot.roster.remove_member(member)
         self.bot.webhook.send(f'Member {member.name} left clan.')
 
     async def on_player_change(self, old, new, player):
@@ -425,6 +428,10 @@ class WarStatus(commands.Cog):
         self.bot.webhook.send(f'Clan {war.clan.name} just entered {state} state.')
 
     async def on_war_attack(self, attack, war):
+        stats = self.bot.get_cog('WarStats')
+        if stats:
+            stats.add_attack(attack, war)
+
         self.bot.webhook.send(f'New attack: {attack.attacker.name} just attacked '
                               f'{attack.defender.name} for {attack.stars} stars and '
                               f'{attack.destruction}%. in {war.clan.name}')
@@ -93,5 +93,41 @@ def migrate(ctx, cog, quiet):
     click.echo(f'Done migrating {cog}.')
 
 
+@db.command(short_help='runs the newest migrations')
+@click.argument('cog', nargs=1, metavar='[cog]')
+@click.option('-q', '--quiet', help='less verbose output', is_flag=True)
+def upgrade(cog, quiet):
+    """Run the newest migration written by `db migrate` for each table in a cog, including any backfill."""
+    run = asyncio.get_event_loop().run_until_complete
+    try:
+        run(Table.create_pool(creds['postgresql']))
+    except Exception:
+        click.echo(f'Could not create PostgreSQL connection pool.\n{traceback.format_exc()}', err=True)
+        return
+
+    if not cog.startswith('cogs.'):
+        cog = f'cogs.{cog}'
+
+    try:
+        importlib.import_module(cog)
+    except Exception:
+        click.echo(f'Could not load {cog}.\n{traceback.format_exc()}', err=True)
+        return
+
+    for table in Table.all_tables():
+        if table.__module__ != cog:
+            continue
+
+        try:
+            migrated = run(table.migrate(verbose=not quiet))
+        except Exception:
+            click.echo(f'Could not upgrade {table.__tablename__}.\n{traceback.format_exc()}', err=True)
+        else:
+            if migrated is False:
+                click.echo(f'[{table.__module__}] No migration to run for {table.__tablename__}.')
+            else:
+                click.echo(f'[{table.__module__}] Upgraded {table.__tablename__}.')
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file